@@ -1,51 +1,251 @@
-from flask import Flask, request, jsonify, render_template, redirect, session
+from flask import Flask, Blueprint, current_app, request, jsonify, render_template, redirect, session, g, send_from_directory, \
+    has_request_context, before_render_template, template_rendered
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_bcrypt import Bcrypt
-from sqlalchemy.ext.hybrid import hybrid_property
+from flask_migrate import Migrate
+import click
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
 from datetime import datetime, date, time
-import csv, os
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.secret_key = os.environ.get('SECRET_KEY')
-
-db = SQLAlchemy(app)
-ma = Marshmallow(app)
-bcrypt = Bcrypt(app)
+from markupsafe import Markup
+from types import SimpleNamespace
+from sqlalchemy import event
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy.exc import IntegrityError
+import csv, gzip, hashlib, hmac, io, json, mimetypes, os, shutil, threading
+import time as clock
+
+db = SQLAlchemy()
+ma = Marshmallow()
+bcrypt = Bcrypt()
+migrate = Migrate()
+bp = Blueprint("fsl", __name__, cli_group=None)
+
+
+class PasswordHasher:
+    # bcrypt runs on a small pool so a login burst queues for a few hash slots
+    # instead of holding every request thread for the full hash time.
+    def init_app(self, app):
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.wait = app.config['PASSWORD_HASH_WAIT']
+
+    def run(self, function, *args):
+        if not self.slots.acquire(timeout=self.wait):
+            raise TimeoutError("Password hashing is busy")
+        try:
+            return self.pool.submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+password_hasher = PasswordHasher()
+
+
+class AttemptThrottle:
+    def __init__(self):
+        self.window = 60
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.window = app.config['AUTH_ATTEMPT_WINDOW']
+
+    def allow(self, key, limit):
+        now = clock.monotonic()
+        with self.lock:
+            attempts = self.attempts.setdefault(key, deque())
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= limit:
+                return False
+            attempts.append(now)
+            if len(self.attempts) > 10000:
+                self.attempts = {k: v for k, v in self.attempts.items() if v and v[-1] > now - self.window}
+            return True
+
+auth_throttle = AttemptThrottle()
+
+def allow_auth_attempt(email):
+    ip_allowed = auth_throttle.allow(("ip", request.remote_addr), current_app.config['AUTH_ATTEMPTS_PER_IP'])
+    email_allowed = auth_throttle.allow(("email", (email or "").lower()), current_app.config['AUTH_ATTEMPTS_PER_EMAIL'])
+    return ip_allowed and email_allowed
+
+
+STATIC_BUILD_DIR = 'build'
+STATIC_MAX_AGE = 365 * 24 * 3600
+STATIC_COMPRESSIBLE = ('.css', '.js', '.svg')
+STATIC_WEBP_SOURCES = ('.png', '.jpg', '.jpeg')
+
+class StaticAssets:
+    # `flask build-assets` copies every static file to static/build under a content
+    # hash and records the mapping, so url_for('static', ...) can point at a name
+    # that never changes and browsers can keep it for a year.
+    def __init__(self):
+        self.files = {}
+        self.webp = {}
+        self.compressed = set()
+        self.built = set()
+
+    def init_app(self, app):
+        path = os.path.join(app.static_folder, STATIC_BUILD_DIR, 'manifest.json')
+        if os.path.exists(path):
+            with open(path) as file:
+                manifest = json.load(file)
+            self.files = manifest['files']
+            self.webp = manifest['webp']
+            self.compressed = set(manifest['compressed'])
+            self.built = set(self.files.values())
 
+    @staticmethod
+    def build(static_folder):
+        build_folder = os.path.join(static_folder, STATIC_BUILD_DIR)
+        shutil.rmtree(build_folder, ignore_errors=True)
+        files, sizes, compressed = {}, {}, []
+        for root, dirs, names in os.walk(static_folder):
+            dirs[:] = [name for name in dirs if os.path.join(root, name) != build_folder]
+            for name in names:
+                source = os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+                with open(os.path.join(root, name), 'rb') as file:
+                    data = file.read()
+                stem, ext = os.path.splitext(source)
+                built = f"{STATIC_BUILD_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+                os.makedirs(os.path.dirname(os.path.join(static_folder, built)), exist_ok=True)
+                with open(os.path.join(static_folder, built), 'wb') as file:
+                    file.write(data)
+                if ext.lower() in STATIC_COMPRESSIBLE:
+                    packed = gzip.compress(data, compresslevel=9, mtime=0)
+                    if len(packed) < len(data):
+                        with open(os.path.join(static_folder, built + '.gz'), 'wb') as file:
+                            file.write(packed)
+                        compressed.append(built)
+                files[source] = built
+                sizes[source] = len(data)
+
+        # a twin is the .webp with the same name in the same folder, used only when it is smaller
+        twins = {os.path.splitext(source)[0].lower(): source for source in files if source.lower().endswith('.webp')}
+        webp = {}
+        for source, built in files.items():
+            stem, ext = os.path.splitext(source)
+            twin = twins.get(stem.lower())
+            if ext.lower() in STATIC_WEBP_SOURCES and twin and sizes[twin] < sizes[source]:
+                webp[built] = files[twin]
+
+        manifest = {'files': files, 'webp': webp, 'compressed': sorted(compressed)}
+        with open(os.path.join(build_folder, 'manifest.json'), 'w') as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        return manifest
+
+static_assets = StaticAssets()
+
+def accepts(values, wanted):
+    # wildcards like */* do not count: only an explicit mention opts a client in
+    return any(value == wanted for value in values.values())
+
+def serve_static(filename):
+    if filename not in static_assets.built:
+        return current_app.send_static_file(filename)
+    served, encoding = filename, None
+    if filename in static_assets.webp and accepts(request.accept_mimetypes, 'image/webp'):
+        served = static_assets.webp[filename]
+    elif filename in static_assets.compressed and accepts(request.accept_encodings, 'gzip'):
+        served, encoding = filename + '.gz', 'gzip'
+    response = send_from_directory(
+        current_app.static_folder, served,
+        mimetype=mimetypes.guess_type(served if encoding is None else filename)[0],
+        max_age=STATIC_MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if filename in static_assets.webp:
+        response.vary.add('Accept')
+    if filename in static_assets.compressed:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
 
     
 # Defining models
 class GameWeek(db.Model):
+    # a single row, id 1, so concurrent first calls cannot each create a gameweek
     id = db.Column(db.Integer, primary_key=True)
     current_week = db.Column(db.Integer, nullable=False, default=1)
+    deadline = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.CheckConstraint('id = 1', name='ck_game_week_single_row'),
+    )
 
     @staticmethod
-    def get_current_week():
-        game_week = GameWeek.query.first()
-        if game_week:
-            return game_week.current_week
-        else:
-            new_game_week = GameWeek(current_week=1)
-            db.session.add(new_game_week)
+    def get():
+        game_week = db.session.get(GameWeek, 1)
+        if game_week is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(GameWeek(id=1, current_week=1))
+            except IntegrityError:
+                pass
             db.session.commit()
-            return new_game_week.current_week
+            game_week = db.session.get(GameWeek, 1)
+        return game_week
 
     @staticmethod
-    def increment_week():
-        game_week = GameWeek.query.first()
-        if game_week:
-            game_week.current_week += 1
-            db.session.commit()
-        else:
-            new_game_week = GameWeek(current_week=2)
-            db.session.add(new_game_week)
-            db.session.commit()
+    def locked():
+        # for writers: read the row itself, not the worker's cached copy
+        GameWeek.get()
+        return GameWeek.query.filter_by(id=1).with_for_update().one()
+
+    @staticmethod
+    def get_current_week():
+        return gameweek_cache.current().week
+
+    @staticmethod
+    def update(**values):
+        GameWeek.get()
+        db.session.execute(
+            db.update(GameWeek).where(GameWeek.id == 1).values(**values).
+            execution_options(synchronize_session=False)
+        )
+        DataVersion.bump('gameweek')
+        db.session.commit()
+        gameweek_cache.invalidate()
+
+    @staticmethod
+    def increment_week(deadline=None):
+        GameWeek.update(current_week=GameWeek.current_week + 1, deadline=deadline)
+
+    @staticmethod
+    def set_deadline(deadline):
+        GameWeek.update(deadline=deadline)
 
 
 
+class DataVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def get(name):
+        version = db.session.query(DataVersion.version).filter_by(name=name).scalar()
+        return version or 0
+
+    @staticmethod
+    def get_many(*names):
+        versions = dict(db.session.query(DataVersion.name, DataVersion.version).filter(DataVersion.name.in_(names)))
+        return [versions.get(name, 0) for name in names]
+
+    @staticmethod
+    def bump(name):
+        updated = DataVersion.query.filter_by(name=name).\
+            update({DataVersion.version: DataVersion.version + 1}, synchronize_session=False)
+        if not updated:
+            db.session.add(DataVersion(name=name, version=1))
+            db.session.flush()
+
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
@@ -54,10 +254,24 @@ class User(db.Model):
     favteam = db.Column(db.String(50), nullable=False)
     
     def set_password(self, password):
-        self.password = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password = password_hasher.run(bcrypt.generate_password_hash, password).decode('utf-8')
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password, password)
+        return password_hasher.run(bcrypt.check_password_hash, self.password, password)
+
+    def password_needs_rehash(self):
+        try:
+            return int(self.password.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
+        except (AttributeError, IndexError, ValueError):
+            return True
+
+PLAYER_POSITIONS = ["Attacker", "Goalkeeper", "Midfielder", "Defender"]
+PLAYER_SEARCH_LIMIT = 250
+SQUAD_BUDGET = 85
+SQUAD_CLUB_LIMIT = 3
+SQUAD_QUOTAS = {'Goalkeeper': 2, 'Defender': 5, 'Midfielder': 5, 'Attacker': 3}
+FSL_TABLE_PAGE_SIZE = 50
+SQUAD_WRITE_ATTEMPTS = 3
 
 player_teams = db.Table('player_teams',
     db.Column('player_id', db.Integer, db.ForeignKey('player.id'), primary_key=True),
@@ -66,43 +280,130 @@ player_teams = db.Table('player_teams',
 
 class Team(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True)
     user = db.relationship("User", backref="teams")
     team_name = db.Column(db.String(50), nullable=False)
-    total_points = db.Column(db.Integer, default=0)
+    total_points = db.Column(db.Integer, default=0, nullable=False)
+    gameweek_points = db.Column(db.Integer, default=0, nullable=False)
     players = db.relationship('Player', secondary=player_teams, backref=db.backref('teams', lazy=True))
     budget = db.Column(db.Integer, default=85)
     captain_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)
     captain = db.relationship('Player', foreign_keys=[captain_id])
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_team_total_points_id', 'total_points', 'id'),
+    )
     
     @property
     def current_points(self):
-        try:
-            if not self.players:
-                return 0
-            else:
-                points = 0
-                for player in self.players:
-                    if player.id == self.captain_id:
-                        points += player.current_points * 3
-                    else:
-                        points += player.current_points
-                return points
-        except:
-            return 0
-
-    def add_total_points(self):
-        self.total_points += self.current_points
-        db.session.commit()
+        return self.gameweek_points or 0
+
+    @staticmethod
+    def refresh_gameweek_points(team_ids=None):
+        multiplier = db.case((Player.id == Team.captain_id, 3), else_=1)
+        points = db.select(db.func.coalesce(db.func.sum(db.func.coalesce(Player.current_points, 0) * multiplier), 0)).\
+            join(player_teams, player_teams.c.player_id == Player.id).\
+            where(player_teams.c.team_id == Team.id).\
+            scalar_subquery()
+        statement = db.update(Team).values(gameweek_points=points)
+        if team_ids is not None:
+            statement = statement.where(Team.id.in_(team_ids))
+        db.session.flush()
+        db.session.execute(statement.execution_options(synchronize_session=False))
+
+    @staticmethod
+    def add_all_total_points():
+        Team.refresh_gameweek_points()
+        db.session.execute(
+            db.update(Team).
+            values(total_points=db.func.coalesce(Team.total_points, 0) + Team.gameweek_points, gameweek_points=0).
+            execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def with_ranks(rows):
+        # RANK() over the whole table would sort every team for each page; instead count
+        # the teams at or above the page's first points once, and rank the rest from there
+        if not rows:
+            return []
+        first = rows[0].total_points
+        above, through_first = db.session.query(
+            db.func.count(db.case((Team.total_points > first, 1))),
+            db.func.count(Team.id)
+        ).filter(Team.total_points >= first).one()
+        ranked, rank, passed = [], above + 1, through_first
+        for index, row in enumerate(rows):
+            if row.total_points != first and row.total_points != rows[index - 1].total_points:
+                rank = passed + 1
+            ranked.append(SimpleNamespace(**row._asdict(), rank=rank))
+            if row.total_points != first:
+                passed += 1
+        return ranked
+
+    @staticmethod
+    def standings_page(after=None, before=None, start=None, limit=FSL_TABLE_PAGE_SIZE):
+        # keyset pages on (total_points, id), newest team first within a tie: each page is a
+        # LIMITed range scan of ix_team_total_points_id rather than a sort of the whole table
+        key = db.tuple_(Team.total_points, Team.id)
+        query = db.select(Team.id, Team.user_id, Team.team_name, Team.total_points, Team.gameweek_points).\
+            limit(limit + 1)
+        if before is not None:
+            rows = db.session.execute(
+                query.where(key > db.tuple_(*before)).order_by(Team.total_points, Team.id)
+            ).all()
+            return Team.with_ranks(rows[:limit][::-1]), len(rows) > limit, True
+        query = query.order_by(Team.total_points.desc(), Team.id.desc())
+        if after is not None:
+            query = query.where(key < db.tuple_(*after))
+        elif start is not None:
+            query = query.where(key <= db.tuple_(*start))
+        rows = db.session.execute(query).all()
+        has_previous = after is not None or (
+            start is not None and db.session.query(
+                db.exists().where(key > db.tuple_(*start))
+            ).scalar()
+        )
+        return Team.with_ranks(rows[:limit]), has_previous, len(rows) > limit
     
     @property
     def remaining_budget(self):
-        return 85 - sum(player.price for player in self.players)
-    
-    def set_captain(self, player_id):
-        if player_id in [player.id for player in self.players]:
-            self.captain_id = player_id
-            db.session.commit()
+        return SQUAD_BUDGET - sum(player.price for player in self.players)
+
+    @staticmethod
+    def claim(team_id, version):
+        # compare-and-set on the version: it fails if another write got there first,
+        # and the UPDATE holds the team's row lock until commit so writes to one team
+        # apply one after another without blocking other teams
+        claimed = db.session.execute(
+            db.update(Team).where(Team.id == team_id, Team.version == version).
+            values(version=Team.version + 1).
+            execution_options(synchronize_session=False)
+        ).rowcount
+        return claimed == 1
+
+    @staticmethod
+    def set_players(team_id, player_ids):
+        current = {player_id for player_id, in db.session.query(player_teams.c.player_id).
+                   filter(player_teams.c.team_id == team_id)}
+        wanted = set(player_ids)
+        if current - wanted:
+            db.session.execute(player_teams.delete().where(
+                player_teams.c.team_id == team_id,
+                player_teams.c.player_id.in_(current - wanted)
+            ))
+        if wanted - current:
+            db.session.execute(player_teams.insert(),
+                               [{'team_id': team_id, 'player_id': player_id} for player_id in wanted - current])
+
+    @staticmethod
+    def refresh_team_points(team_id):
+        # the cached FSL table only needs a new 'squads' version when the points moved,
+        # which before a deadline they rarely do, so transfers don't queue on that row
+        before = db.session.query(Team.gameweek_points).filter_by(id=team_id).scalar()
+        Team.refresh_gameweek_points([team_id])
+        if db.session.query(Team.gameweek_points).filter_by(id=team_id).scalar() != before:
+            DataVersion.bump('squads')
 
 class Player(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -112,13 +413,76 @@ class Player(db.Model):
     SwepLeagueTeam_id = db.Column(db.Integer, db.ForeignKey('swep_league_team.id'), nullable=False)
     current_points = db.Column(db.Integer, default=0)
     total_points = db.Column(db.Integer, default=0)
-    
-    def reset_current_points(self):
-        self.total_points += self.current_points
-        self.current_points = 0
-        db.session.commit()
+
+    __table_args__ = (
+        db.Index('ix_player_name', 'name'),
+        # text_pattern_ops lets Postgres serve lower(name) LIKE 'prefix%' under any collation
+        db.Index('ix_player_lower_name', db.func.lower(name).label('lower_name'),
+                 postgresql_ops={'lower_name': 'text_pattern_ops'}),
+        db.Index('ix_player_position_price', 'position', 'price'),
+        db.Index('ix_player_team_price', 'SwepLeagueTeam_id', 'price'),
+    )
+
+    @staticmethod
+    def search(position=None, team_id=None, min_price=None, max_price=None, name=None, prefix=False,
+               sort=None, limit=PLAYER_SEARCH_LIMIT, offset=0):
+        query = Player.query
+        if position:
+            query = query.filter(Player.position == position)
+        if team_id:
+            query = query.filter(Player.SwepLeagueTeam_id == team_id)
+        if min_price is not None:
+            query = query.filter(Player.price >= min_price)
+        if max_price is not None:
+            query = query.filter(Player.price <= max_price)
+        if name:
+            lowered = db.func.lower(Player.name)
+            if prefix:
+                query = query.filter(lowered.startswith(name.lower(), autoescape=True))
+            else:
+                query = query.filter(lowered.contains(name.lower(), autoescape=True))
+        order = PLAYER_SEARCH_SORTS.get(sort, Player.id)
+        return query.order_by(order, Player.id).\
+            limit(max(1, min(limit, PLAYER_SEARCH_LIMIT))).offset(max(0, offset)).all()
+
+    @staticmethod
+    def missing_ids(player_ids):
+        player_ids = set(player_ids)
+        if not player_ids:
+            return []
+        found = {player_id for player_id, in db.session.query(Player.id).filter(Player.id.in_(player_ids))}
+        return sorted(player_ids - found)
+
+    @staticmethod
+    def set_current_points(points):
+        if not points:
+            return
+        db.session.execute(
+            Player.__table__.update().
+            where(Player.__table__.c.id == db.bindparam('b_id')).
+            values(current_points=db.bindparam('b_points')),
+            [{'b_id': player_id, 'b_points': value} for player_id, value in points.items()]
+        )
+
+    @staticmethod
+    def reset_all_current_points():
+        db.session.execute(
+            db.update(Player).
+            values(
+                total_points=db.func.coalesce(Player.total_points, 0) + db.func.coalesce(Player.current_points, 0),
+                current_points=0
+            ).
+            execution_options(synchronize_session=False)
+        )
         
 
+PLAYER_SEARCH_SORTS = {
+    'price': Player.price.asc(),
+    '-price': Player.price.desc(),
+    'points': Player.total_points.asc(),
+    '-points': Player.total_points.desc()
+}
+
 match_saves = db.Table('match_saves',
     db.Column('match_id', db.Integer, db.ForeignKey('match.id'), primary_key=True),
     db.Column('player_id', db.Integer, db.ForeignKey('player.id'), primary_key=True),
@@ -147,6 +511,14 @@ match_red_cards = db.Table('match_red_cards',
     db.Column('player_id', db.Integer, db.ForeignKey('player.id'), primary_key=True)
 )
 
+MATCH_EVENT_TABLES = {
+    'saves': match_saves,
+    'goals': match_goals,
+    'assists': match_assists,
+    'yellow_cards': match_yellow_cards,
+    'red_cards': match_red_cards
+}
+
 class Fixture(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     game_week = db.Column(db.Integer, nullable=False)
@@ -157,6 +529,11 @@ class Fixture(db.Model):
     home_team = db.relationship('SwepLeagueTeam', foreign_keys=[home_team_id], backref='home_fixtures')
     away_team = db.relationship('SwepLeagueTeam', foreign_keys=[away_team_id], backref='away_fixtures')
 
+    __table_args__ = (
+        db.Index('ix_fixture_game_week', 'game_week'),
+        db.Index('ix_fixture_home_team_id_away_team_id', 'home_team_id', 'away_team_id'),
+    )
+
 class Match(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     fixture_id = db.Column(db.Integer, db.ForeignKey('fixture.id'), nullable=False)
@@ -178,38 +555,116 @@ class Match(db.Model):
     yellow_cards = db.relationship('Player', secondary=match_yellow_cards, backref=db.backref('yellow_cards_in_matches', lazy='dynamic'))
     red_cards = db.relationship('Player', secondary=match_red_cards, backref=db.backref('red_cards_in_matches', lazy='dynamic'))
     
+    __table_args__ = (
+        db.UniqueConstraint('fixture_id', name='uq_match_fixture_id'),
+        db.Index('ix_match_game_week', 'game_week'),
+    )
+
     __mapper_args__ = {
         'polymorphic_identity': 'match',
     }
 
+    @staticmethod
+    def events_query(match_ids=None):
+        selects = []
+        for stat_type, table in MATCH_EVENT_TABLES.items():
+            select = db.select(
+                db.literal(stat_type).label('stat_type'),
+                table.c.match_id,
+                table.c.player_id,
+                (db.func.coalesce(table.c.count, 1) if 'count' in table.c else db.literal(1)).label('count')
+            )
+            if match_ids is not None:
+                select = select.where(table.c.match_id.in_(match_ids))
+            selects.append(select)
+        return db.union_all(*selects)
+
+    @staticmethod
+    def write_events(events_by_match):
+        # events_by_match maps match id -> {stat_type: {player_id: count}}; only the
+        # rows that differ from what is stored are deleted, inserted or updated, and
+        # the (match id, player id) pairs whose rows changed are returned
+        existing = {
+            (row.stat_type, row.match_id, row.player_id): row.count
+            for row in db.session.execute(Match.events_query(list(events_by_match)))
+        }
+        wanted = {
+            (stat_type, match_id, player_id): count
+            for match_id, events in events_by_match.items()
+            for stat_type, counts in events.items()
+            for player_id, count in counts.items() if count > 0
+        }
+        for stat_type, table in MATCH_EVENT_TABLES.items():
+            deletes = [
+                {'b_match_id': match_id, 'b_player_id': player_id}
+                for (stat, match_id, player_id) in existing
+                if stat == stat_type and (stat, match_id, player_id) not in wanted
+            ]
+            inserts = [
+                {'match_id': match_id, 'player_id': player_id, 'count': count}
+                if 'count' in table.c else {'match_id': match_id, 'player_id': player_id}
+                for (stat, match_id, player_id), count in wanted.items()
+                if stat == stat_type and (stat, match_id, player_id) not in existing
+            ]
+            updates = [
+                {'b_match_id': match_id, 'b_player_id': player_id, 'b_count': count}
+                for (stat, match_id, player_id), count in wanted.items()
+                if stat == stat_type and 'count' in table.c and existing.get((stat, match_id, player_id), count) != count
+            ]
+            if deletes:
+                db.session.execute(
+                    table.delete().where(table.c.match_id == db.bindparam('b_match_id'),
+                                         table.c.player_id == db.bindparam('b_player_id')),
+                    deletes
+                )
+            if inserts:
+                db.session.execute(table.insert(), inserts)
+            if updates:
+                db.session.execute(
+                    table.update().where(table.c.match_id == db.bindparam('b_match_id'),
+                                         table.c.player_id == db.bindparam('b_player_id')).
+                    values(count=db.bindparam('b_count')),
+                    updates
+                )
+        changed = set()
+        for key in set(existing) | set(wanted):
+            if existing.get(key) != wanted.get(key):
+                changed.add((key[1], key[2]))
+        return changed
+
+    @staticmethod
+    def preload_events(matches):
+        pending = {match.id: match for match in matches if getattr(match, '_events', None) is None}
+        if pending:
+            events = Match.events_query(list(pending)).subquery()
+            rows = db.session.query(Player, events.c.match_id, events.c.stat_type, events.c.count).\
+                join(events, events.c.player_id == Player.id).\
+                order_by(Player.id).all()
+            for match in pending.values():
+                match._events = {
+                    team_id: {stat_type: [] for stat_type in MATCH_EVENT_TABLES}
+                    for team_id in (match.home_team_id, match.away_team_id)
+                }
+            for player, match_id, stat_type, count in rows:
+                match_events = pending[match_id]._events
+                if player.SwepLeagueTeam_id in match_events:
+                    match_events[player.SwepLeagueTeam_id][stat_type].append((player, count))
+        return matches
+
+    def load_events(self):
+        Match.preload_events([self])
+        return self._events
+
     def get_player_stat(self, stat_type, team_id):
-        if stat_type in ['saves', 'goals', 'assists']:
-            return db.session.query(Player, getattr(Match, stat_type).prop.secondary.c.count).\
-                join(getattr(Match, stat_type).prop.secondary).\
-                filter(getattr(Match, stat_type).prop.secondary.c.match_id == self.id).\
-                filter(Player.SwepLeagueTeam_id == team_id).all()
-        else:
-            return [(player, 1) for player in getattr(self, stat_type) if player.SwepLeagueTeam_id == team_id]
+        return self.load_events().get(team_id, {}).get(stat_type, [])
 
     @property
     def home_stats(self):
-        return {
-            'saves': self.get_player_stat('saves', self.home_team_id),
-            'goals': self.get_player_stat('goals', self.home_team_id),
-            'assists': self.get_player_stat('assists', self.home_team_id),
-            'yellow_cards': self.get_player_stat('yellow_cards', self.home_team_id),
-            'red_cards': self.get_player_stat('red_cards', self.home_team_id)
-        }
+        return self.load_events()[self.home_team_id]
 
     @property
     def away_stats(self):
-        return {
-            'saves': self.get_player_stat('saves', self.away_team_id),
-            'goals': self.get_player_stat('goals', self.away_team_id),
-            'assists': self.get_player_stat('assists', self.away_team_id),
-            'yellow_cards': self.get_player_stat('yellow_cards', self.away_team_id),
-            'red_cards': self.get_player_stat('red_cards', self.away_team_id)
-        }
+        return self.load_events()[self.away_team_id]
 
     @property
     def home_stats_count(self):
@@ -238,6 +693,37 @@ class UserChallenge(db.Model):
     challenge_gameweek = db.Column(db.Integer, nullable=False)
     predictions = db.relationship("UserPrediction", backref="challenge", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_user_challenge_user_id_challenge_gameweek', 'user_id', 'challenge_gameweek'),
+        db.Index('ix_user_challenge_challenge_gameweek', 'challenge_gameweek'),
+    )
+
+    @staticmethod
+    def award_bonus_points(gameweek):
+        outcome = db.case(
+            (Match.home_score > Match.away_score, 'home win'),
+            (Match.home_score < Match.away_score, 'away win'),
+            else_='draw'
+        )
+        correct = db.select(
+            UserChallenge.id,
+            UserChallenge.user_id,
+            db.func.count(UserPrediction.id).label('correct')
+        ).join(UserPrediction, UserPrediction.challenge_id == UserChallenge.id).\
+            join(Match, Match.fixture_id == UserPrediction.fixture_id).\
+            where(UserChallenge.challenge_gameweek == gameweek, UserPrediction.prediction == outcome).\
+            group_by(UserChallenge.id, UserChallenge.user_id).subquery()
+        bonus = db.select(
+            correct.c.user_id,
+            db.func.sum(db.case((correct.c.correct == 4, 7), (correct.c.correct == 3, 5), else_=0)).label('points')
+        ).group_by(correct.c.user_id).subquery()
+        db.session.execute(
+            db.update(Team).
+            values(total_points=db.func.coalesce(Team.total_points, 0) + bonus.c.points).
+            where(Team.user_id == bonus.c.user_id, bonus.c.points > 0).
+            execution_options(synchronize_session=False)
+        )
+
 class UserPrediction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     challenge_id = db.Column(db.Integer, db.ForeignKey("user_challenge.id"), nullable=False)
@@ -245,6 +731,10 @@ class UserPrediction(db.Model):
     prediction = db.Column(db.String(10), nullable=False)
     fixture = db.relationship("Fixture", backref="predictions")
 
+    __table_args__ = (
+        db.UniqueConstraint('challenge_id', 'fixture_id', name='uq_user_prediction_challenge_id_fixture_id'),
+    )
+
 
 player_swepteams = db.Table('player_swepteams',
     db.Column('player_id', db.Integer, db.ForeignKey('player.id'), primary_key=True),
@@ -257,84 +747,190 @@ class SwepLeagueTeam(db.Model):
     team_name = db.Column(db.String(20), nullable=False)
     players = db.relationship('Player', backref='swep_league_team', lazy='dynamic')    
     
-    @hybrid_property
+    @staticmethod
+    def results_subquery():
+        home = db.select(
+            Match.home_team_id.label('team_id'),
+            Match.home_score.label('scored'),
+            Match.away_score.label('conceded')
+        )
+        away = db.select(
+            Match.away_team_id.label('team_id'),
+            Match.away_score.label('scored'),
+            Match.home_score.label('conceded')
+        )
+        return db.union_all(home, away).subquery()
+
+    @staticmethod
+    def standings():
+        points = db.func.coalesce(LeagueStanding.points, 0)
+        goal_diff = db.func.coalesce(LeagueStanding.goals_for - LeagueStanding.goals_against, 0)
+        goals_for = db.func.coalesce(LeagueStanding.goals_for, 0)
+        return SwepLeagueTeam.query.outerjoin(SwepLeagueTeam.league_standing).\
+            options(db.contains_eager(SwepLeagueTeam.league_standing)).\
+            order_by(points.desc(), goal_diff.desc(), goals_for.desc(), SwepLeagueTeam.id).all()
+
+    @property
+    def standing(self):
+        if self.league_standing is None:
+            return LeagueStanding(team_id=self.id, matches_played=0, wins=0, draws=0, losses=0,
+                                  goals_for=0, goals_against=0, points=0)
+        return self.league_standing
+
+    @property
     def matches_played(self):
-        home_matches = Match.query.filter_by(home_team_id = self.id).all()
-        away_matches = Match.query.filter_by(away_team_id = self.id).all()
-        return len(home_matches) + len(away_matches)
-    
-    @hybrid_property
+        return self.standing.matches_played
+
+    @property
     def wins(self):
-        home_matches = Match.query.filter_by(home_team_id = self.id).all()
-        away_matches = Match.query.filter_by(away_team_id = self.id).all()
-        count = 0
-        for match in home_matches:
-            if match and match.home_score > match.away_score:
-                count += 1
-        for match in away_matches:
-            if match and  match.home_score < match.away_score:
-                count +=1
-        return count
-    
-    @hybrid_property
+        return self.standing.wins
+
+    @property
     def draws(self):
-        home_matches = Match.query.filter_by(home_team_id = self.id).all()
-        away_matches = Match.query.filter_by(away_team_id = self.id).all()
-        count = 0
-        for match in home_matches:
-            if match and match.home_score == match.away_score:
-                count += 1
-        for match in away_matches:
-            if match and  match.home_score == match.away_score:
-                count +=1
-        return count
-    
-    @hybrid_property
+        return self.standing.draws
+
+    @property
     def losses(self):
-        home_matches = Match.query.filter_by(home_team_id = self.id).all()
-        away_matches = Match.query.filter_by(away_team_id = self.id).all()
-        count = 0
-        for match in home_matches:
-            if match and match.home_score < match.away_score:
-                count += 1
-        for match in away_matches:
-            if match and  match.home_score > match.away_score:
-                count +=1
-        return count
-    
-    @hybrid_property
+        return self.standing.losses
+
+    @property
     def goals_for(self):
-        home_matches = Match.query.filter_by(home_team_id = self.id).all()
-        away_matches = Match.query.filter_by(away_team_id = self.id).all()
-        count = 0
-        for match in home_matches:
-            if match :
-                count += match.home_score
-        for match in away_matches:
-            if match :
-                count += match.away_score
-        return count
-    
-    @hybrid_property
+        return self.standing.goals_for
+
+    @property
     def goals_against(self):
-        home_matches = Match.query.filter_by(home_team_id = self.id).all()
-        away_matches = Match.query.filter_by(away_team_id = self.id).all()
-        count = 0
-        for match in home_matches:
-            if match :
-                count += match.away_score
-        for match in away_matches:
-            if match :
-                count += match.home_score
-        return count
-    
-    @hybrid_property
+        return self.standing.goals_against
+
+    @property
     def goal_diff(self):
         return self.goals_for - self.goals_against
-    
-    @hybrid_property
+
+    @property
     def total_points(self):
-        return 3 * self.wins + self.draws
+        return self.standing.points
+
+class LeagueStanding(db.Model):
+    __tablename__ = 'league_standings'
+    team_id = db.Column(db.Integer, db.ForeignKey('swep_league_team.id'), primary_key=True)
+    matches_played = db.Column(db.Integer, default=0, nullable=False)
+    wins = db.Column(db.Integer, default=0, nullable=False)
+    draws = db.Column(db.Integer, default=0, nullable=False)
+    losses = db.Column(db.Integer, default=0, nullable=False)
+    goals_for = db.Column(db.Integer, default=0, nullable=False)
+    goals_against = db.Column(db.Integer, default=0, nullable=False)
+    points = db.Column(db.Integer, default=0, nullable=False)
+
+    team = db.relationship('SwepLeagueTeam', backref=db.backref('league_standing', uselist=False))
+
+    @staticmethod
+    def apply_result(home_team_id, away_team_id, home_score, away_score, sign=1):
+        # sign=-1 takes a result back out, so an edited match is removed and re-applied
+        for team_id, scored, conceded in ((home_team_id, home_score, away_score),
+                                          (away_team_id, away_score, home_score)):
+            if db.session.get(LeagueStanding, team_id) is None:
+                db.session.add(LeagueStanding(team_id=team_id, matches_played=0, wins=0, draws=0, losses=0,
+                                              goals_for=0, goals_against=0, points=0))
+                db.session.flush()
+            won = int(scored > conceded)
+            drawn = int(scored == conceded)
+            db.session.query(LeagueStanding).filter_by(team_id=team_id).update({
+                LeagueStanding.matches_played: LeagueStanding.matches_played + sign,
+                LeagueStanding.wins: LeagueStanding.wins + sign * won,
+                LeagueStanding.draws: LeagueStanding.draws + sign * drawn,
+                LeagueStanding.losses: LeagueStanding.losses + sign * int(scored < conceded),
+                LeagueStanding.goals_for: LeagueStanding.goals_for + sign * scored,
+                LeagueStanding.goals_against: LeagueStanding.goals_against + sign * conceded,
+                LeagueStanding.points: LeagueStanding.points + sign * (3 * won + drawn)
+            }, synchronize_session='fetch')
+
+    @staticmethod
+    def rebuild():
+        results = SwepLeagueTeam.results_subquery()
+        won = db.func.coalesce(db.func.sum(db.case((results.c.scored > results.c.conceded, 1), else_=0)), 0)
+        drawn = db.func.coalesce(db.func.sum(db.case((results.c.scored == results.c.conceded, 1), else_=0)), 0)
+        lost = db.func.coalesce(db.func.sum(db.case((results.c.scored < results.c.conceded, 1), else_=0)), 0)
+        totals = db.select(
+            SwepLeagueTeam.id,
+            db.func.count(results.c.team_id),
+            won,
+            drawn,
+            lost,
+            db.func.coalesce(db.func.sum(results.c.scored), 0),
+            db.func.coalesce(db.func.sum(results.c.conceded), 0),
+            3 * won + drawn
+        ).outerjoin(results, results.c.team_id == SwepLeagueTeam.id).group_by(SwepLeagueTeam.id)
+        db.session.query(LeagueStanding).delete()
+        db.session.execute(db.insert(LeagueStanding).from_select(
+            ['team_id', 'matches_played', 'wins', 'draws', 'losses', 'goals_for', 'goals_against', 'points'],
+            totals
+        ))
+        DataVersion.bump('results')
+        db.session.commit()
+
+DEFAULT_SCORING_RULES = {
+    'Goalkeeper': {'goals': 6, 'assists': 3, 'saves': 1, 'yellow_cards': -1, 'red_cards': -3},
+    'Defender': {'goals': 6, 'assists': 3, 'saves': 0, 'yellow_cards': -1, 'red_cards': -3},
+    'Midfielder': {'goals': 5, 'assists': 3, 'saves': 0, 'yellow_cards': -1, 'red_cards': -3},
+    'Attacker': {'goals': 4, 'assists': 3, 'saves': 0, 'yellow_cards': -1, 'red_cards': -3}
+}
+
+class ScoringRule(db.Model):
+    __tablename__ = 'scoring_rules'
+    position = db.Column(db.String(20), primary_key=True)
+    stat_type = db.Column(db.String(20), primary_key=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def seed_defaults():
+        existing = {(rule.position, rule.stat_type) for rule in ScoringRule.query.all()}
+        rows = [
+            {'position': position, 'stat_type': stat_type, 'points': points}
+            for position, rules in DEFAULT_SCORING_RULES.items()
+            for stat_type, points in rules.items()
+            if (position, stat_type) not in existing
+        ]
+        if rows:
+            db.session.execute(db.insert(ScoringRule), rows)
+
+    @staticmethod
+    def configured():
+        return db.session.query(ScoringRule.position).first() is not None
+
+    @staticmethod
+    def score_gameweek(gameweek, player_ids=None):
+        # Sets current_points from the recorded match events of the gameweek in two
+        # set-based UPDATEs: zero the scope, then write the aggregated rule points.
+        events = Match.events_query().subquery()
+        scored_player = db.aliased(Player)
+        points = db.select(
+            events.c.player_id,
+            db.func.sum(events.c.count * ScoringRule.points).label('points')
+        ).join(Match, Match.id == events.c.match_id).\
+            join(scored_player, scored_player.id == events.c.player_id).\
+            join(ScoringRule, (ScoringRule.position == scored_player.position) & (ScoringRule.stat_type == events.c.stat_type)).\
+            where(Match.game_week == gameweek)
+        if player_ids is not None:
+            points = points.where(events.c.player_id.in_(player_ids))
+        points = points.group_by(events.c.player_id).subquery()
+
+        reset = db.update(Player).values(current_points=0)
+        if player_ids is not None:
+            reset = reset.where(Player.id.in_(player_ids))
+        db.session.execute(reset.execution_options(synchronize_session=False))
+        db.session.execute(
+            db.update(Player).
+            values(current_points=points.c.points).
+            where(Player.id == points.c.player_id).
+            execution_options(synchronize_session=False)
+        )
+
+        if player_ids is None:
+            Team.refresh_gameweek_points()
+        else:
+            Team.refresh_gameweek_points(
+                db.select(player_teams.c.team_id).where(player_teams.c.player_id.in_(player_ids))
+            )
+        DataVersion.bump('reference')
 
 # Defining schemas
 class UserSchema(ma.SQLAlchemyAutoSchema):
@@ -348,7 +944,7 @@ class TeamSchema(ma.SQLAlchemyAutoSchema):
         load_instance = True
         include_relationships = True
         include_fk = True 
-        exclude = ("user", "players", "captain")  
+        exclude = ("user",)  
 
     user = ma.Nested('UserSchema', exclude=('teams',))
     players = ma.Nested('PlayerSchema', many=True, exclude=('teams',))
@@ -363,6 +959,7 @@ class PlayerSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Player
         load_instance = True
+        include_fk = True
 
 class FixtureSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
@@ -377,7 +974,7 @@ class MatchSchema(FixtureSchema):
         model = Match
         load_instance = True
         include_fk = True
-        exclude = ("home_team", "away_team", "fixture", "saves", "goals", "assists", "yellow_cards", "red_cards")
+        exclude = ("home_team", "away_team", "fixture")
 
     home_team = ma.Nested('SwepLeagueTeamSchema', only=('id', 'team_name'))
     away_team = ma.Nested('SwepLeagueTeamSchema', only=('id', 'team_name'))
@@ -389,8 +986,23 @@ class MatchSchema(FixtureSchema):
     yellow_cards = ma.Method("get_yellow_cards")
     red_cards = ma.Method("get_red_cards")
 
+    def get_events(self, obj, stat_type):
+        return [{'player_id': player.id, 'count': count} for player, count in obj.get_player_stat(stat_type, obj.home_team_id) + obj.get_player_stat(stat_type, obj.away_team_id)]
+
     def get_saves(self, obj):
-        return [{'player_id': save.id, 'count': count} for save, count in obj.get_player_stat('saves', obj.home_team_id) + obj.get_player_stat('saves', obj.away_team_id)]
+        return self.get_events(obj, 'saves')
+
+    def get_goals(self, obj):
+        return self.get_events(obj, 'goals')
+
+    def get_assists(self, obj):
+        return self.get_events(obj, 'assists')
+
+    def get_yellow_cards(self, obj):
+        return self.get_events(obj, 'yellow_cards')
+
+    def get_red_cards(self, obj):
+        return self.get_events(obj, 'red_cards')
 
 
 class UserChallengeSchema(ma.SQLAlchemyAutoSchema):
@@ -424,8 +1036,275 @@ class SwepLeagueTeamSchema(ma.SQLAlchemyAutoSchema):
     total_points = ma.Integer(dump_only=True)
 
 
+class ReferenceCache:
+    # Teams and the player catalog only change on admin writes, which bump the
+    # 'reference' DataVersion, so each worker keeps a snapshot until the stamp moves.
+    def __init__(self):
+        self.version = None
+        self.teams = []
+        self.teamnames = {}
+        self.players = []
+        self.lock = threading.Lock()
+
+    def load(self, version):
+        with self.lock:
+            if version == self.version:
+                return
+            self.teams = db.session.query(SwepLeagueTeam.id, SwepLeagueTeam.team_name).\
+                order_by(SwepLeagueTeam.id).all()
+            self.teamnames = {team.id: team.team_name for team in self.teams}
+            self.players = db.session.query(
+                Player.id,
+                Player.name,
+                Player.position,
+                Player.price,
+                Player.SwepLeagueTeam_id,
+                Player.current_points,
+                Player.total_points
+            ).order_by(Player.id).all()
+            self.version = version
+
+reference_cache = ReferenceCache()
+
+def reference_version():
+    if 'reference_version' not in g:
+        g.reference_version = DataVersion.get('reference')
+    return g.reference_version
+
+def reference_data():
+    version = reference_version()
+    if version != reference_cache.version:
+        reference_cache.load(version)
+    return reference_cache
+
+
+class GameWeekCache:
+    # The current week and its deadline change once a week, so each worker keeps
+    # them and checks the 'gameweek' DataVersion at most every GAMEWEEK_CHECK_INTERVAL
+    # seconds. The worker that writes the row drops its copy straight away.
+    def __init__(self):
+        self.version = None
+        self.week = 1
+        self.deadline = None
+        self.checked = 0.0
+        self.interval = 5
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.interval = app.config['GAMEWEEK_CHECK_INTERVAL']
+        self.invalidate()
+
+    def invalidate(self):
+        self.version = None
+
+    def current(self):
+        now = clock.monotonic()
+        if self.version is None or now - self.checked >= self.interval:
+            version = DataVersion.get('gameweek')
+            if version != self.version:
+                self.load(version)
+            self.checked = now
+        return self
+
+    def load(self, version):
+        with self.lock:
+            game_week = GameWeek.get()
+            self.week, self.deadline = game_week.current_week, game_week.deadline
+            self.version = version
+
+gameweek_cache = GameWeekCache()
+
+
+class FragmentCache:
+    # Rendered HTML that is the same for every user. Keys carry the gameweek and the
+    # data versions a fragment depends on, so a write never has to find and delete
+    # entries: it bumps a version and stale keys age out of the LRU.
+    def __init__(self):
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.size = app.config['FRAGMENT_CACHE_SIZE']
+        self.entries.clear()
+
+    def get(self, key):
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        with self.lock:
+            self.entries[key] = html
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+fragment_cache = FragmentCache()
+
+PAGE_VERSIONS = ('fixtures', 'results', 'reference', 'squads')
+
+def page_versions():
+    if 'page_versions' not in g:
+        g.page_versions = dict(zip(PAGE_VERSIONS, DataVersion.get_many(*PAGE_VERSIONS)))
+        g.page_versions['gameweek'] = GameWeek.get_current_week()
+        g.reference_version = g.page_versions['reference']
+    return g.page_versions
+
+def cached_fragment(template, depends_on, render, *key):
+    versions = page_versions()
+    cache_key = (template, versions['gameweek'], *(versions[name] for name in depends_on), *key)
+    html = fragment_cache.get(cache_key)
+    if html is None:
+        html = render_template(template, **render())
+        fragment_cache.set(cache_key, html)
+    return Markup(html)
+
+
+METRIC_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRIC_STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+METRIC_HISTOGRAMS = {
+    'fsl_request_duration_seconds': ("Time from the start of a request to its response", METRIC_LATENCY_BUCKETS),
+    'fsl_request_sql_seconds': ("Time a request spent executing SQL", METRIC_LATENCY_BUCKETS),
+    'fsl_request_render_seconds': ("Time a request spent rendering templates", METRIC_LATENCY_BUCKETS),
+    'fsl_request_sql_statements': ("SQL statements a request executed", METRIC_STATEMENT_BUCKETS),
+}
+
+class RequestMetrics:
+    # Cursor and template hooks add up SQL and render time in g while a request runs;
+    # teardown folds the totals into per-endpoint histograms and logs requests slower
+    # than SLOW_REQUEST_MS. Teardown runs even when an exception escapes the view, so
+    # those count as 500s. Like the caches above, the numbers are per worker.
+    def __init__(self):
+        self.slow = 0.5
+        self.histograms = {name: {} for name in METRIC_HISTOGRAMS}
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.slow = app.config['SLOW_REQUEST_MS'] / 1000
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self.before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self.after_cursor_execute)
+            event.listen(db.engine, 'handle_error', self.handle_error)
+        before_render_template.connect(self.before_render, app)
+        template_rendered.connect(self.after_render, app)
+        app.before_request(self.start_request)
+        app.after_request(self.note_status)
+        app.teardown_request(self.finish_request)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(clock.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.finish_statement(conn)
+
+    def handle_error(self, context):
+        # a failed statement never reaches after_cursor_execute; without this its start
+        # time would stay on the pooled connection and skew the next statement's timing
+        if context.connection is not None:
+            self.finish_statement(context.connection)
+
+    def finish_statement(self, conn):
+        started = conn.info.get('statement_started')
+        if not started:
+            return
+        elapsed = clock.perf_counter() - started.pop()
+        if has_request_context() and 'metrics' in g:
+            g.metrics['statements'] += 1
+            g.metrics['sql'] += elapsed
+
+    def before_render(self, sender, template, context, **extra):
+        if 'metrics' in g:
+            g.metrics['rendering'].append(clock.perf_counter())
+
+    def after_render(self, sender, template, context, **extra):
+        if 'metrics' in g and g.metrics['rendering']:
+            started = g.metrics['rendering'].pop()
+            if not g.metrics['rendering']:
+                g.metrics['render'] += clock.perf_counter() - started
+
+    def start_request(self):
+        g.metrics = {'started': clock.perf_counter(), 'statements': 0, 'sql': 0.0, 'render': 0.0, 'rendering': []}
+
+    def note_status(self, response):
+        if 'metrics' in g:
+            g.metrics['status'] = response.status_code
+        return response
+
+    def finish_request(self, error=None):
+        metrics = g.pop('metrics', None)
+        if metrics is None:
+            return
+        total = clock.perf_counter() - metrics['started']
+        endpoint = request.endpoint or 'unmatched'
+        status = metrics.get('status', 500)
+        with self.lock:
+            self.observe('fsl_request_duration_seconds', endpoint, total)
+            self.observe('fsl_request_sql_seconds', endpoint, metrics['sql'])
+            self.observe('fsl_request_render_seconds', endpoint, metrics['render'])
+            self.observe('fsl_request_sql_statements', endpoint, metrics['statements'])
+            key = (endpoint, request.method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+        if total >= self.slow:
+            # the path only: admin routes take passwords in the query string
+            current_app.logger.warning(
+                "Slow request %s %s -> %s in %.0f ms: %d SQL statements in %.0f ms, %.0f ms rendering",
+                request.method, request.path, status, total * 1000,
+                metrics['statements'], metrics['sql'] * 1000, metrics['render'] * 1000
+            )
+
+    def observe(self, name, endpoint, value):
+        # bucket counts are kept cumulative, as the exposition format wants them
+        buckets = METRIC_HISTOGRAMS[name][1]
+        counts = self.histograms[name].setdefault(endpoint, [0] * (len(buckets) + 2))
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                counts[index] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def exposition(self):
+        lines = []
+        with self.lock:
+            for name, (description, buckets) in METRIC_HISTOGRAMS.items():
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+                for endpoint, counts in sorted(self.histograms[name].items()):
+                    for bound, count in zip(buckets, counts):
+                        lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {counts[-1]}')
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {counts[-2]}')
+                    lines.append(f'{name}_count{{endpoint="{endpoint}"}} {counts[-1]}')
+            lines += ["# HELP fsl_requests_total Requests answered", "# TYPE fsl_requests_total counter"]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'fsl_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+request_metrics = RequestMetrics()
+
+
+def current_user_and_team():
+    if 'current_user' not in g:
+        g.current_user, g.current_team = None, None
+        user_id = session.get("user_id")
+        if user_id is not None:
+            user = User.query.options(
+                db.joinedload(User.teams).joinedload(Team.players),
+                db.joinedload(User.teams).joinedload(Team.captain)
+            ).filter_by(id=user_id).first()
+            if user:
+                g.current_user = user
+                g.current_team = user.teams[0] if user.teams else None
+    return g.current_user, g.current_team
+
+
 def is_allowed_time():
     now = datetime.now()
+    deadline = gameweek_cache.current().deadline
+    if deadline is not None:
+        return now < deadline
     day_of_week = now.weekday()
     current_time = now.time()
     if (day_of_week == 5 and current_time >= time(6, 0)) or \
@@ -433,23 +1312,31 @@ def is_allowed_time():
         return False
     return True
 
+def transfers_closed():
+    # names the rule is_allowed_time applied: the gameweek deadline once one is set
+    current = gameweek_cache.current()
+    if current.deadline is not None:
+        message = f"Transfers for gameweek {current.week} closed at the deadline, {current.deadline:%a %d %b %Y %H:%M}."
+    else:
+        message = "Transfers are not allowed between Saturday 6 AM and Sunday 7 PM."
+    return jsonify({"error": message}), 403
+
 
 # Defining API endpoints
 
-@app.route("/", methods=["GET"])
+@bp.route("/", methods=["GET"])
 def start():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
+    user, _ = current_user_and_team()
     if not user :
         return render_template("sign_in.html")
     else:
         return redirect("/fixtures")
     
-@app.route("/signup", methods=["GET"])
+@bp.route("/signup", methods=["GET"])
 def signup_page():
     return render_template("sign_up.html")
 
-@app.route("/register", methods=["POST"])
+@bp.route("/register", methods=["POST"])
 def register_user():
     data = None
     
@@ -473,6 +1360,9 @@ def register_user():
     favteam = data.get("favteam")
 
     
+    if not allow_auth_attempt(email):
+        return render_template("sign_up.html", msg ="Too many attempts, try again later"), 429
+
     existing_user = User.query.filter((User.username == username) | (User.email == email)).first()
     if existing_user:
         return render_template("sign_up.html", msg ="Username or email already exists"), 400
@@ -485,18 +1375,22 @@ def register_user():
 
         team = Team(user_id=user.id, team_name=team_name)
         db.session.add(team)
+        DataVersion.bump('squads')
         db.session.commit()
 
         session['user_id'] = user.id
         
         return redirect("/pickteam")
+    except TimeoutError:
+        db.session.rollback()
+        return render_template("sign_up.html", msg ="Server busy, try again"), 503
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error creating user: {e}")
+        current_app.logger.error(f"Error creating user: {e}")
         return render_template("sign_up.html", msg ="Error creating user"), 500
 
 
-@app.route("/login", methods=["POST"])
+@bp.route("/login", methods=["POST"])
 def login_user():
     data = None
     if request.is_json:
@@ -512,11 +1406,18 @@ def login_user():
     
     if not email or not password:
         return render_template("sign_in.html", msg="Invalid request"), 400
+
+    if not allow_auth_attempt(email):
+        return render_template("sign_in.html", msg="Too many attempts, try again later"), 429
     
     try:
         user = User.query.filter_by(email = email).first()
         if not user or not user.check_password(password):
             return render_template("sign_in.html", msg="Invalid credentials"), 401
+
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
         
         team = Team.query.filter_by(user_id=user.id).first()
         if not team:
@@ -528,300 +1429,389 @@ def login_user():
             return redirect("/pickteam")
         else:
             return redirect("/fixtures")
+    except TimeoutError:
+        return render_template("sign_in.html", msg="Server busy, try again"), 503
     except Exception as e:
         return render_template("sign_in.html", msg=f"{e}"), 500
     
-@app.route("/pickteam" , methods=["GET"])
+@bp.route("/pickteam" , methods=["GET"])
 def pickplayers():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
+    user, team = current_user_and_team()
     if not user:
         return redirect("/")
-    team = Team.query.filter_by(user_id = user.id).first()
     if len(team.players) == 15:
         return redirect("/fixtures")
-    players = Player.query.all()
-    swepteam = SwepLeagueTeam.query.all()
-    teamdict = {team.id : team.team_name for team in swepteam}
+    players = reference_data().players
+    teamdict = reference_data().teamnames
     return render_template("pickteam.html", teamnames = teamdict, players=players)
         
     
 
-@app.route("/checkpickedteam", methods=["GET", "POST"])
+def check_squad(player_ids):
+    # returns the squad's players, or an error response when it breaks a squad rule
+    if len(set(player_ids)) != len(player_ids):
+        return None, (jsonify({'error': "A player is repeated"}), 400)
+
+    players = Player.query.filter(Player.id.in_(player_ids)).all()
+    if len(players) != len(player_ids):
+        missing = set(player_ids) - {player.id for player in players}
+        return None, (jsonify({'error': f"Players {sorted(missing)} not found in database"}), 404)
+
+    total_price = sum(player.price for player in players)
+    if total_price > SQUAD_BUDGET:
+        return None, (jsonify({'error': f"Total price exceeds budget ({SQUAD_BUDGET}): {total_price}"}), 400)
+
+    for position, quota in SQUAD_QUOTAS.items():
+        picked = sum(1 for player in players if player.position == position)
+        if picked != quota:
+            return None, (jsonify({'error': f"Pick {quota} players for {position}, got {picked}"}), 400)
+
+    club_counts = {}
+    for player in players:
+        club_counts[player.SwepLeagueTeam_id] = club_counts.get(player.SwepLeagueTeam_id, 0) + 1
+    if max(club_counts.values()) > SQUAD_CLUB_LIMIT:
+        return None, (jsonify({'error': f"You cannot pick more than {SQUAD_CLUB_LIMIT} players from the same team"}), 400)
+    return players, None
+
+def default_captain(players):
+    captain = None
+    for player in players:
+        if captain is None or player.price > captain.price:
+            captain = player
+    return captain
+
+def claim_team(team, expected):
+    # a client that sent the version it saw gets a 409 if the team moved since;
+    # one that didn't is retried against the latest version a few times
+    for _ in range(SQUAD_WRITE_ATTEMPTS):
+        version = team.version if expected is None else expected
+        if Team.claim(team.id, version):
+            return version + 1, None
+        db.session.rollback()
+        if expected is not None:
+            break
+    current = db.session.query(Team.version).filter_by(id=team.id).scalar()
+    return None, (jsonify({"error": "Your team was changed elsewhere, reload and try again", "version": current}), 409)
+
+@bp.route("/checkpickedteam", methods=["GET", "POST"])
 def check_and_submit_teams():
     try:
-        current_user = session.get("user_id")
-        user = User.query.filter_by(id=current_user).first()
+        user, team = current_user_and_team()
+        if not user:
+            return jsonify({'error': "No user found"}), 400
         data = request.get_json()
         players = data.get('players', [])
         
         if len(players) == 0:
             return jsonify({'error': "No players selected"}), 400
-        
-        seen_id = set()
-        total_price = 0
-        max_price = 0
-        captain = None
-        for player in players:
-            name = player.get('name')
-            playerdb = Player.query.filter_by(name=name).first()
-            
-            if not playerdb:
-                return jsonify({'error': f"Player '{name}' not found in database"}), 404
-            if playerdb.id in seen_id:
-                return jsonify({'error': f"Player '{name}' is repeated"}), 400
-            if playerdb.price > max_price:
-                max_price = playerdb.price
-                captain = playerdb
-            seen_id.add(playerdb.id)
-            total_price += playerdb.price
-
-
-        if total_price > 85:
-            return jsonify({'error': f"Total price exceeds budget (100): {total_price}"}), 400
-        
-        team = Team.query.filter_by(user_id=user.id).first()
+
+        try:
+            player_ids = [int(player.get('id') if isinstance(player, dict) else player) for player in players]
+        except (TypeError, ValueError):
+            return jsonify({'error': "Every player must be sent by id"}), 400
+
+        playersdb, error = check_squad(player_ids)
+        if error:
+            return error
+        captain = default_captain(playersdb)
+
         if not team:
-            team = Team(user_id=user.id, team_name="Default Team Name")
+            team = Team(user_id=user.id, team_name="Default Team Name", captain_id=captain.id)
             db.session.add(team)
-        
-        team.players = [Player.query.filter_by(id =player_id).first() for player_id in seen_id]
-        team.captain = captain
-        team.captain_id = captain.id
+            db.session.flush()
+            DataVersion.bump('squads')
+        else:
+            _, conflict = claim_team(team, None)
+            if conflict:
+                return conflict
+            db.session.execute(
+                db.update(Team).where(Team.id == team.id).values(captain_id=captain.id).
+                execution_options(synchronize_session=False)
+            )
+
+        Team.set_players(team.id, player_ids)
+        db.session.expire(team, ['players', 'captain'])
+        Team.refresh_team_points(team.id)
         db.session.commit()  
         return jsonify({'success': 'Succesfully picked'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
     
-@app.route("/fixtures", methods=["GET"])
+@bp.route("/fixtures", methods=["GET"])
 def fixtures_and_matches():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
+    user, team = current_user_and_team()
     if not user:
         return redirect("/")
-    fixtures = Fixture.query.all()
-    fixture_schema = FixtureSchema(many=True)
-    fixtures_data = fixture_schema.dump(fixtures)
+    gameweek = page_versions()['gameweek']
 
-    team = Team.query.filter_by(user_id=user.id).first()
+    def upcoming():
+        fixtures = Fixture.query.options(db.joinedload(Fixture.home_team), db.joinedload(Fixture.away_team)).all()
+        return {"fixtures": FixtureSchema(many=True).dump(fixtures), "matchday": gameweek}
 
-    captain = team.captain
-    
-    matches = Match.query.all()    
-    matches.reverse()
-    swepteam = SwepLeagueTeam.query.all()
-    teamdict = {team.id : team.team_name for team in swepteam}
-    gameweek = GameWeek.get_current_week()
+    def results():
+        matches = Match.query.all()
+        matches.reverse()
+        return {"matches": matches, "teamnames": reference_data().teamnames}
 
-    return render_template("Fixtures.html", fixtures=fixtures_data, matches=matches, matchday=gameweek, user=user, teamnames = teamdict, team = team, captain = captain )
+    captain = team.captain
+    return render_template(
+        "Fixtures.html", matchday=gameweek, user=user, team = team, captain = captain,
+        upcoming = cached_fragment("fixtures_upcoming.html", ('fixtures', 'reference'), upcoming),
+        results = cached_fragment("fixtures_results.html", ('results', 'reference'), results)
+    )
 
-@app.route("/match_details", methods=["Get", "Post"])
+@bp.route("/match_details", methods=["Get", "Post"])
 def show_stats():
     home_name = request.args.get("home")
     away_name = request.args.get("away")
     if not home_name or not away_name:
         return "Home team or away team not specified", 400
 
-    home_team = SwepLeagueTeam.query.filter_by(team_name=home_name).first()
-    away_team = SwepLeagueTeam.query.filter_by(team_name=away_name).first()
-
-    if home_team is None or away_team is None:
+    teamids = {name: id for id, name in reference_data().teamnames.items()}
+    if home_name not in teamids or away_name not in teamids:
         return "One or both teams not found", 404
 
-    match = Match.query.filter_by(home_team_id = home_team.id, away_team_id = away_team.id).first()
-    swepteam = SwepLeagueTeam.query.all()
-    teamdict = {team.id : team.team_name for team in swepteam}
-    return render_template("match.html", match = match, teamnames = teamdict)
+    def details():
+        match = Match.query.filter_by(home_team_id = teamids[home_name], away_team_id = teamids[away_name]).first()
+        return {"match": match, "teamnames": reference_data().teamnames}
+    return cached_fragment("match.html", ('results', 'reference'), details, home_name, away_name)
 
 
 
-@app.route("/tables" , methods=["GET"])
+def table_cursor(value):
+    # "points,id" of the row a page continues from
+    try:
+        points, team_id = value.split(",")
+        return int(points), int(team_id)
+    except (AttributeError, ValueError):
+        return None
+
+@bp.route("/tables" , methods=["GET"])
 def show_all_stats():
-    swepteams = SwepLeagueTeam.query.all()
-    swepteams.sort(key=lambda team: team.total_points, reverse=True)
-    fslteams = Team.query.order_by(Team.total_points.desc()).all()
-    teams_data = [
-        {
-            "team_name": team.team_name,
-            "total_points": team.total_points,
-            "current_points": team.current_points
-        } for team in fslteams
-    ]
-    return render_template("Tables.html", swepteams = swepteams, fslteams = teams_data)
-
-@app.route("/transfers", methods=["GET"])
+    my_team = None
+    if session.get("user_id") is not None:
+        my_team = db.session.query(Team.id, Team.total_points).\
+            filter_by(user_id=session["user_id"]).order_by(Team.id).first()
+    start = (my_team.total_points, my_team.id) if my_team and request.args.get("me") else None
+    after = table_cursor(request.args.get("after"))
+    before = table_cursor(request.args.get("before"))
+
+    def fsl_table():
+        fslteams, has_previous, has_next = Team.standings_page(after=after, before=before, start=start)
+        teams_data = [
+            {
+                "id": team.id,
+                "rank": team.rank,
+                "team_name": team.team_name,
+                "total_points": team.total_points,
+                "current_points": team.gameweek_points
+            } for team in fslteams
+        ]
+        return {
+            "fslteams": teams_data,
+            "previous_cursor": f"{fslteams[0].total_points},{fslteams[0].id}" if fslteams and has_previous else None,
+            "next_cursor": f"{fslteams[-1].total_points},{fslteams[-1].id}" if fslteams and has_next else None
+        }
+
+    def swep_table():
+        return {"swepteams": SwepLeagueTeam.standings()}
+
+    my_rank = None
+    if my_team:
+        my_rank = 1 + db.session.query(db.func.count(Team.id)).\
+            filter(Team.total_points > my_team.total_points).scalar()
+    return render_template(
+        "Tables.html",
+        swep_table = cached_fragment("tables_swep.html", ('results',), swep_table),
+        fsl_table = cached_fragment("tables_fsl.html", ('reference', 'squads'), fsl_table, after, before, start),
+        my_team_id = my_team.id if my_team else None, my_rank = my_rank
+    )
+
+@bp.route("/transfers", methods=["GET"])
 def showteam_and_players():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
+    user, team = current_user_and_team()
     if not user:
         return redirect("/")
-    team = Team.query.filter_by(user_id=user.id).first()
-    players = Player.query.all()
+    players = reference_data().players
     if not team:
         return redirect("/")
     chosen_players = team.players
     remaining_budget = team.remaining_budget
-    swepteam = SwepLeagueTeam.query.all()
-    teamdict = {team.id : team.team_name for team in swepteam}
+    teamdict = reference_data().teamnames
     
-    return render_template("Transfers.html", team=chosen_players, players = players, team_budget = remaining_budget, teamnames = teamdict)
+    return render_template("Transfers.html", team=chosen_players, players = players, team_budget = remaining_budget, teamnames = teamdict, team_version = team.version)
 
-@app.route("/maketransfer" , methods=["GET","POST"])
+@bp.route("/maketransfer" , methods=["GET","POST"])
 def make_transfer():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
-    team = Team.query.filter_by(user_id=user.id).first()
+    user, team = current_user_and_team()
     if not is_allowed_time():
-        return jsonify({"error": "Transfers are not allowed between Saturday 6 AM and Sunday 7 PM."}), 403
+        return transfers_closed()
     if not user:
         return redirect("/")
     if not team:
         return jsonify({"error": "Team not found"}), 404
 
-    data = request.get_json()
-    new_player_ids = data.get('players')
+    data = request.get_json(silent=True) or {}
+    try:
+        new_player_ids = [int(player_id) for player_id in data.get('players') or []]
+        expected = int(data['version']) if data.get('version') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "Players and version must be numbers"}), 400
 
     if not new_player_ids:
         return jsonify({"error": "No players provided"}), 400
 
-    new_players = Player.query.filter(Player.id.in_(new_player_ids)).all()
-
-    if len(new_player_ids) != len(new_players):
-        return jsonify({"error": "Some players not found"}), 404
-
-    budget_remaining = team.remaining_budget
-    total_price_new_players = sum(player.price for player in new_players)
-
-    current_players = team.players
-    total_price_current_players = sum(player.price for player in current_players)
-
-    if total_price_new_players > total_price_current_players + budget_remaining:
-        return jsonify({"error": "Not enough budget remaining"}), 400
-
-    team.players = new_players
+    new_players, error = check_squad(new_player_ids)
+    if error:
+        return error
+
+    version, conflict = claim_team(team, expected)
+    if conflict:
+        return conflict
+    Team.set_players(team.id, new_player_ids)
+    captain_id = db.session.query(Team.captain_id).filter_by(id=team.id).scalar()
+    if captain_id not in new_player_ids:
+        db.session.execute(
+            db.update(Team).where(Team.id == team.id).values(captain_id=default_captain(new_players).id).
+            execution_options(synchronize_session=False)
+        )
+    Team.refresh_team_points(team.id)
     db.session.commit()
-    return jsonify({"message": "Transfers successful"}), 200
+    return jsonify({"message": "Transfers successful", "version": version}), 200
 
-@app.route("/points", methods=["GET"])
+@bp.route("/points", methods=["GET"])
 def display_points():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
+    user, team = current_user_and_team()
     if not user:
         return redirect("/")
-    team = Team.query.filter_by(user_id=user.id).first()
     players = team.players
-    swepteam = SwepLeagueTeam.query.all()
-    teamdict = {team.id : team.team_name for team in swepteam}
+    teamdict = reference_data().teamnames
     return render_template("Points.html", players = players, team = team , teamnames = teamdict)
 
-@app.route("/myteam", methods=["Get", "Post"])
+@bp.route("/myteam", methods=["Get", "Post"])
 def manage_team():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
+    user, team = current_user_and_team()
     if not user:
         return redirect("/")
-    team = Team.query.filter_by(user_id=user.id).first()
-    remaining_budget = team.remaining_budget
     if not team:
         return redirect("/")
+    remaining_budget = team.remaining_budget
     chosen_players = team.players
     captain = team.captain
-    swepteam = SwepLeagueTeam.query.all()
-    teamdict = {team.id : team.team_name for team in swepteam}
-    return render_template("Myteam.html" , user = user , team = chosen_players, teamnames = teamdict, remaining_budget = remaining_budget, captain = captain)
+    teamdict = reference_data().teamnames
+    return render_template("Myteam.html" , user = user , team = chosen_players, teamnames = teamdict, remaining_budget = remaining_budget, captain = captain, team_version = team.version)
 
 
-@app.route('/change_captain', methods = ['Get'])
+@bp.route('/change_captain', methods = ['POST'])
 def change_captain():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
+    user, team = current_user_and_team()
     if not is_allowed_time():
-        return jsonify({"error": "Transfers are not allowed between Saturday 6 AM and Sunday 7 PM."}), 403
+        return transfers_closed()
     if not user:
         return jsonify({"error": "No user found"}), 400
-    team = Team.query.filter_by(user_id=user.id).first()
     if not team:
         return jsonify({"error": "Team not found"}), 404
-    data = request.args.get("captain")
-    if not data :
-        return jsonify({'error': 'no data found'})
-    team.captain_id = int(data)
-    captain = Player.query.filter_by(id = int(data)).first()
-    if not captain:
-        return jsonify({'error': 'Player not Found'})
-    team.captain = captain
+    data = (request.get_json(silent=True) if request.is_json else request.form) or {}
+    try:
+        captain_id = int(data.get("captain"))
+        expected = int(data["version"]) if data.get("version") is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'no data found'}), 400
+
+    version, conflict = claim_team(team, expected)
+    if conflict:
+        return conflict
+    in_squad = db.session.query(player_teams.c.player_id).\
+        filter_by(team_id=team.id, player_id=captain_id).first()
+    if not in_squad:
+        db.session.rollback()
+        return jsonify({'error': 'Player not in your team'}), 400
+    db.session.execute(
+        db.update(Team).where(Team.id == team.id).values(captain_id=captain_id).
+        execution_options(synchronize_session=False)
+    )
+    Team.refresh_team_points(team.id)
     db.session.commit()
-    return jsonify({"success": 'Captain Changed Succesfully'})
-
-@app.route("/filter_pickteam", methods=["Get","Post"])
+    return jsonify({"success": 'Captain Changed Succesfully', "version": version})
+
+def player_search_args(args):
+    search = {
+        'position': args.get("position"),
+        'name': args.get("name"),
+        'prefix': args.get("match") == "prefix",
+        'sort': args.get("sort"),
+        'min_price': args.get("min_price", type=float),
+        'max_price': args.get("max_price", type=float),
+        'limit': args.get("limit", PLAYER_SEARCH_LIMIT, type=int),
+        'offset': args.get("offset", 0, type=int)
+    }
+    teamname = {name : id for id, name in reference_data().teamnames.items()}
+    team = args.get("team")
+    if team and team != "All":
+        search['team_id'] = teamname.get(team, -1)
+
+    # the filter inputs send a single free-form "argument" value
+    argument = args.get("argument")
+    if argument and argument not in ("All", "0"):
+        if argument.isnumeric():
+            search['min_price'] = float(argument)
+        elif argument in PLAYER_POSITIONS:
+            search['position'] = argument
+        elif argument in teamname:
+            search['team_id'] = teamname[argument]
+        else:
+            search['name'] = argument
+    return search
+
+def render_player_search(template):
+    search = player_search_args(request.args)
+    players = Player.search(**search)
+    if not players and search['name']:
+        search['name'] = None
+        players = Player.search(**search)
+    return render_template(template, players = players, price = request.args.get("argument"), teamnames = reference_data().teamnames)
+
+@bp.route("/search_players", methods=["GET"])
+def search_players():
+    if request.args.get("view") == "pickteam":
+        return render_player_search("pickteamfilter.html")
+    return render_player_search("filter.html")
+
+@bp.route("/filter_pickteam", methods=["Get","Post"])
 def filter_pickteams():
-    positions_list = ["Attacker", "Goalkeeper", "Midfielder", "Defender"]
-    filter = request.args.get("argument")
-    swepteam = SwepLeagueTeam.query.all()
-    teamdict = {team.id : team.team_name for team in swepteam}
-    players = []
-    if filter.isnumeric() :
-        Allplayers = Player.query.all()
-        players = [ player for player in Allplayers if player.price >= float(filter)]
-    elif filter in positions_list :
-        players = Player.query.filter_by(position = filter)
-    elif filter :
-        Allplayers = Player.query.all()
-        players = [player for player in Allplayers if filter.lower() in player.name.lower()]
-        if not players or filter == "All" or filter == "0":
-            players = Player.query.all()
-            return render_template("pickteamfilter.html", players = players, price = filter,  teamnames = teamdict)
-    return render_template("pickteamfilter.html", players = players, price = filter,  teamnames = teamdict)
-
-@app.route("/filter", methods=["Get","Post"])
+    return render_player_search("pickteamfilter.html")
+
+@bp.route("/filter", methods=["Get","Post"])
 def filter():
-    positions_list = ["Attacker", "Goalkeeper", "Midfielder", "Defender"]
-    filter = request.args.get("argument")
-    swepteam = SwepLeagueTeam.query.all()
-    teamlist = [team.team_name for team in swepteam]
-    teamdict = {team.id : team.team_name for team in swepteam}
-    teamname = {name : id for id, name in teamdict.items()}
-    players = []
-    if filter.isnumeric() :
-        Allplayers = Player.query.all()
-        players = [ player for player in Allplayers if player.price >= float(filter)]
-    elif filter in positions_list :
-        players = Player.query.filter_by(position = filter)
-    elif filter in teamlist:
-        players = Player.query.filter_by(SwepLeagueTeam_id = teamname.get(filter))
-    elif filter :
-        Allplayers = Player.query.all()
-        players = [player for player in Allplayers if filter.lower() in player.name.lower()]
-        if not players or filter == "All":
-            players = Player.query.all()
-            return render_template("filter.html", players = players, price = filter,  teamnames = teamdict)
-    return render_template("filter.html", players = players, price = filter,  teamnames = teamdict)
-
-@app.route("/challenge", methods=["Get", "Post"])
+    return render_player_search("filter.html")
+
+@bp.route("/challenge", methods=["Get", "Post"])
 def challenge():
-    current_user = session.get("user_id")
-    user = User.query.filter_by(id=current_user).first()
+    user, _ = current_user_and_team()
     return render_template("Challenge.html",user = user )
 
 
-@app.route("/enterchallenge", methods=["Get", "Post"])
+@bp.route("/enterchallenge", methods=["Get", "Post"])
 def enter_challenge():
     return render_template("Manual_Challenge.html")
 
-@app.route("/predict", methods = ["Get", "Post"])
+@bp.route("/predict", methods = ["Get", "Post"])
 def enter_predictions():
     if request.method == "POST":
-        current_user = session.get("user_id")
-        user = User.query.filter_by(id=current_user).first()
+        user, _ = current_user_and_team()
         predictions = request.form.to_dict()
         try:
             gameweek = GameWeek.get_current_week()
-            user = User.query.filter_by(id=current_user).first()
             challenge = UserChallenge.query.filter_by(user_id=user.id, challenge_gameweek=gameweek).first()
             if not challenge:
                 return render_template("Challenge.html", msg="Pay for this gameweek challenge", user = user)
+            existing = {user_prediction.fixture_id: user_prediction for user_prediction in challenge.predictions}
             for fixture_id, prediction in predictions.items():
+                user_prediction = existing.get(int(fixture_id))
+                if user_prediction:
+                    user_prediction.prediction = prediction
+                    continue
                 user_prediction = UserPrediction(
                     challenge_id=challenge.id,
                     fixture_id=fixture_id,
@@ -836,8 +1826,7 @@ def enter_predictions():
             db.session.rollback()
             return render_template("Challenge.html", msg = error, user = user), 500
     else:
-        swepteam = SwepLeagueTeam.query.all()
-        teamdict = {team.id : team.team_name for team in swepteam}
+        teamdict = reference_data().teamnames
         gameweek = GameWeek.get_current_week()
         fixtures = Fixture.query.filter_by(game_week = gameweek).all()
         return render_template("play_challenge.html", fixtures = fixtures, teamnames = teamdict )
@@ -845,7 +1834,7 @@ def enter_predictions():
 
 
 
-@app.route("/admin", methods=["Get","Post"])
+@bp.route("/admin", methods=["Get","Post"])
 def admin():
     password = request.args.get("fslpass")
     if password and password == "fsladmin":
@@ -853,7 +1842,7 @@ def admin():
     else:
         return redirect("/")
 
-@app.route("/create_fixt", methods=["Get", "Post"])
+@bp.route("/create_fixt", methods=["Get", "Post"])
 def create_fixt():
     if request.method == "POST":
         data = request.form.to_dict()
@@ -883,15 +1872,15 @@ def create_fixt():
         )
         
         db.session.add(new_fixture)
+        DataVersion.bump('fixtures')
         db.session.commit()
 
         return render_template("admin.html", msg="Fixtures Created")
     else:
-        swepteam = SwepLeagueTeam.query.all()
-        teamlist = [team.team_name for team in swepteam]
+        teamlist = list(reference_data().teamnames.values())
         return render_template("create_fixture.html", teams=teamlist)
 
-@app.route("/delete_fixt", methods=["Get", "Post"])
+@bp.route("/delete_fixt", methods=["Get", "Post"])
 def delete_fixt():
     if request.method == "POST":
         data = request.form.to_dict()
@@ -912,16 +1901,66 @@ def delete_fixt():
         
         if existing_fixture:
             db.session.delete(existing_fixture)
+            DataVersion.bump('fixtures')
             db.session.commit() 
             return render_template("admin.html", msg="Fixture Deleted")
 
         return render_template("admin.html", msg="Fixture not Found")
     else:
-        swepteam = SwepLeagueTeam.query.all()
-        teamlist = [team.team_name for team in swepteam]
+        teamlist = list(reference_data().teamnames.values())
         return render_template("delete_fixt.html", teams=teamlist)
     
-@app.route("/update_match", methods=["GET", "POST"])
+def save_match_results(results):
+    # results is a list of (fixture, home_score, away_score, events) for distinct fixtures
+    fixture_ids = [fixture.id for fixture, _, _, _ in results]
+    matches = {match.fixture_id: match for match in Match.query.filter(Match.fixture_id.in_(fixture_ids))}
+    saved = []
+    for fixture, home_score, away_score, events in results:
+        match = matches.get(fixture.id)
+        if match:
+            LeagueStanding.apply_result(match.home_team_id, match.away_team_id, match.home_score, match.away_score, sign=-1)
+            match.home_score = home_score
+            match.away_score = away_score
+        else:
+            match = Match(
+                fixture_id=fixture.id,
+                game_week=fixture.game_week,
+                home_team_id=fixture.home_team_id,
+                away_team_id=fixture.away_team_id,
+                kickoff_time=fixture.kickoff_time,
+                home_score=home_score,
+                away_score=away_score
+            )
+            db.session.add(match)
+        saved.append((match, events))
+    db.session.flush()
+
+    for match, _ in saved:
+        LeagueStanding.apply_result(match.home_team_id, match.away_team_id, match.home_score, match.away_score)
+    changed = Match.write_events({match.id: events for match, events in saved})
+    for match, _ in saved:
+        match._events = None
+    DataVersion.bump('results')
+
+    # current_points only holds the current gameweek; a corrected result from an earlier
+    # week has already been rolled into total_points, so it is not rescored into this one
+    current_week = GameWeek.get_current_week()
+    current_matches = {match.id for match, _ in saved if match.game_week == current_week}
+    changed_players = {player_id for match_id, player_id in changed if match_id in current_matches}
+    if current_app.config['AUTO_SCORING'] and changed_players and ScoringRule.configured():
+        ScoringRule.score_gameweek(current_week, changed_players)
+    return [match for match, _ in saved]
+
+def parse_match_events(saves, goals, assists, yellow_cards, red_cards):
+    return {
+        'saves': {int(player_id): int(count or 0) for player_id, count in saves.items()},
+        'goals': {int(player_id): int(count or 0) for player_id, count in goals.items()},
+        'assists': {int(player_id): int(count or 0) for player_id, count in assists.items()},
+        'yellow_cards': {int(player_id): 1 for player_id in yellow_cards},
+        'red_cards': {int(player_id): 1 for player_id in red_cards}
+    }
+
+@bp.route("/update_match", methods=["GET", "POST"])
 def update_matches():
     if request.method == "POST":
         data = request.form.to_dict()
@@ -945,8 +1984,8 @@ def update_matches():
                 player_id = int(key.split('[')[1].split(']')[0])
                 assists[player_id] = int(value) if value else 0
 
-        yellow_cards = [int(player_id) for player_id in request.form.getlist("yellowcards")]
-        red_cards = [int(player_id) for player_id in request.form.getlist("redcards")]
+        yellow_cards = request.form.getlist("yellowcards")
+        red_cards = request.form.getlist("redcards")
 
         home_team = SwepLeagueTeam.query.filter_by(team_name=home_team_name).first()
         away_team = SwepLeagueTeam.query.filter_by(team_name=away_team_name).first()
@@ -959,62 +1998,82 @@ def update_matches():
         if not fixture:
             return render_template("admin.html", msg="Fixture not Found")
 
-        match = Match.query.filter_by(fixture_id=fixture.id).first()
-        if match:
-            match.home_score = home_score
-            match.away_score = away_score
-        else:
-            match = Match(
-                fixture_id=fixture.id,
-                game_week=fixture.game_week,
-                home_team_id=fixture.home_team_id,
-                away_team_id=fixture.away_team_id,
-                kickoff_time=fixture.kickoff_time,
-                home_score=home_score,
-                away_score=away_score
-            )
-            db.session.add(match)
-
-        db.session.query(match_saves).filter_by(match_id=match.id).delete()
-        db.session.query(match_goals).filter_by(match_id=match.id).delete()
-        db.session.query(match_assists).filter_by(match_id=match.id).delete()
-        db.session.query(match_yellow_cards).filter_by(match_id=match.id).delete()
-        db.session.query(match_red_cards).filter_by(match_id=match.id).delete()
-
-        for player_id, count in saves.items():
-            if count > 0:
-                db.session.execute(match_saves.insert().values(match_id=match.id, player_id=player_id, count=count))
-        for player_id, count in goals.items():
-            if count > 0:
-                db.session.execute(match_goals.insert().values(match_id=match.id, player_id=player_id, count=count))
-        for player_id, count in assists.items():
-            if count > 0:
-                db.session.execute(match_assists.insert().values(match_id=match.id, player_id=player_id, count=count))
-        for player_id in yellow_cards:
-            db.session.execute(match_yellow_cards.insert().values(match_id=match.id, player_id=player_id))
-        for player_id in red_cards:
-            db.session.execute(match_red_cards.insert().values(match_id=match.id, player_id=player_id))
-
+        events = parse_match_events(saves, goals, assists, yellow_cards, red_cards)
+        save_match_results([(fixture, home_score, away_score, events)])
         db.session.commit()
 
-        db.session.refresh(match)
-
-        print("Saves:", match.saves)
-        print("Assists:", match.assists)
-        print("Goals:", match.goals)
-        print("Yellow Cards:", match.yellow_cards)
-        print("Red Cards:", match.red_cards)
-
         return render_template("admin.html", msg="Match Updated")
     else:
-        swepteam = SwepLeagueTeam.query.all()
-        teamlist = [team.team_name for team in swepteam]
-        players = Player.query.all()
-        teamdict = {team.id: team.team_name for team in swepteam}
+        teamdict = reference_data().teamnames
+        teamlist = list(teamdict.values())
+        players = reference_data().players
 
         return render_template("update_matches.html", teams=teamlist, players=players, teamnames=teamdict)    
+
+@bp.route("/update_matches_batch", methods=["POST"])
+def update_matches_batch():
+    data = request.get_json(silent=True) or {}
+    results = data.get("matches")
+    if not results or not isinstance(results, list):
+        return jsonify({"error": "No matches provided"}), 400
+
+    # each entry names its fixture by id or by team pair; both kinds are loaded in one query each
+    teamname = {name : id for id, name in reference_data().teamnames.items()}
+    pairs = set()
+    fixture_ids = set()
+    keys = []
+    for index, result in enumerate(results):
+        if not isinstance(result, dict):
+            return jsonify({"error": f"Match {index} is not an object"}), 400
+        if result.get("fixture_id") is not None:
+            try:
+                key = int(result["fixture_id"])
+            except (TypeError, ValueError):
+                return jsonify({"error": f"Match {index} has an invalid fixture_id: {result['fixture_id']!r}"}), 400
+            fixture_ids.add(key)
+        else:
+            key = (teamname.get(result.get("home_team")), teamname.get(result.get("away_team")))
+            pairs.add(key)
+        keys.append(key)
+
+    fixtures = {}
+    if fixture_ids:
+        fixtures.update({fixture.id: fixture for fixture in Fixture.query.filter(Fixture.id.in_(fixture_ids))})
+    if pairs:
+        for fixture in Fixture.query.filter(db.tuple_(Fixture.home_team_id, Fixture.away_team_id).in_(list(pairs))):
+            fixtures.setdefault(fixture.id, fixture)
+    by_pair = {(fixture.home_team_id, fixture.away_team_id): fixture for fixture in fixtures.values()}
+
+    try:
+        parsed = []
+        seen = set()
+        for result, key in zip(results, keys):
+            fixture = fixtures.get(key) if isinstance(key, int) else by_pair.get(key)
+            if not fixture:
+                return jsonify({"error": f"Fixture not found: {result}"}), 404
+            if fixture.id in seen:
+                return jsonify({"error": f"Fixture {fixture.id} is repeated"}), 400
+            seen.add(fixture.id)
+            events = parse_match_events(
+                result.get("saves", {}),
+                result.get("goals", {}),
+                result.get("assists", {}),
+                result.get("yellow_cards", []),
+                result.get("red_cards", [])
+            )
+            parsed.append((fixture, int(result.get("home_score", 0)), int(result.get("away_score", 0)), events))
+
+        matches = save_match_results(parsed)
+        db.session.commit()
+        return jsonify({"success": "Matches updated", "matches": [match.id for match in matches]}), 200
+    except (TypeError, ValueError, AttributeError) as e:
+        db.session.rollback()
+        return jsonify({"error": f"Invalid match data: {e}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
     
-@app.route("/adminfilter", methods=["Get", "Post"])
+@bp.route("/adminfilter", methods=["Get", "Post"])
 def adminfilter():
     home_name = request.args.get("home")
     away_name = request.args.get("away")
@@ -1027,87 +2086,71 @@ def adminfilter():
     if home_team is None or away_team is None:
         return "One or both teams not found", 404
 
-    Allplayers = Player.query.all()
+    Allplayers = reference_data().players
     players = [player for player in Allplayers if player.SwepLeagueTeam_id == home_team.id or player.SwepLeagueTeam_id == away_team.id]
-    swepteam = SwepLeagueTeam.query.all()
-    teamdict = {team.id: team.team_name for team in swepteam}
+    teamdict = reference_data().teamnames
     
     return render_template("adminfilter.html", players=players, teamnames=teamdict)
    
     
-@app.route("/upload_points", methods=["GET", "POST"])
+@bp.route("/upload_points", methods=["GET", "POST"])
 def upload_points():
     if request.method == "POST":
-        data = request.form.to_dict()
-        points = data
         errors = []
+        points = {}
+        upload = request.files.get("points_csv")
+        if upload and upload.filename:
+            rows = csv.reader(io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline=""))
+        else:
+            rows = request.form.items()
         try:
-            for player_id, new_points in points.items():
+            for row in rows:
+                if len(row) < 2 or not row[0].strip() or row[0].strip().lower() == "player_id":
+                    continue
+                player_id, new_points = row[0], row[1]
                 try:
-                    new_points = int(new_points)
-                    if not new_points:
-                        new_points = 0
-                    player = Player.query.filter_by(id = int(player_id)).first()
-                    if player:
-                        player.current_points = new_points
-                    else:
-                        errors.append(f"Player with ID {player_id} not found.")
+                    points[int(player_id)] = int(new_points) if str(new_points).strip() else 0
                 except ValueError:
                     errors.append(f"Invalid points value for player ID {player_id}.")
-                    
+
+            errors.extend(f"Player with ID {player_id} not found." for player_id in Player.missing_ids(points))
             if errors:
                 return render_template("admin.html", msg="Some errors occurred: " + ", ".join(errors))
-            
+
+            Player.set_current_points(points)
+            Team.refresh_gameweek_points(
+                db.select(player_teams.c.team_id).where(player_teams.c.player_id.in_(list(points)))
+            )
+            DataVersion.bump('reference')
             db.session.commit()
-            return render_template("admin.html", msg="Points allocated successfully.")
+            return render_template("admin.html", msg=f"Points allocated successfully for {len(points)} players.")
         except Exception as e:
             db.session.rollback()
             return render_template("admin.html", msg=str(e))
     else:
-        swepteam = SwepLeagueTeam.query.all()
-        players = Player.query.all()
+        swepteam = reference_data().teams
+        players = reference_data().players
         return render_template("upload_points.html", Swepteams=swepteam, players=players)
 
-@app.route("/set_new_gameweek", methods=["GET", "POST"])
+@bp.route("/set_new_gameweek", methods=["GET", "POST"])
 def new_gameweek():
     if request.method == "POST":
         data = request.form.to_dict()
         answer = data.get("answer")
         if answer == "Yes":
+            deadline = None
+            if data.get("deadline"):
+                try:
+                    deadline = datetime.strptime(data["deadline"], '%Y-%m-%dT%H:%M')
+                except ValueError:
+                    return render_template("admin.html", msg="Invalid deadline"), 400
             try:
-                gameweek = GameWeek.get_current_week()
-                user_challenges = UserChallenge.query.filter_by(challenge_gameweek=gameweek).all()
-                
-                for challenge in user_challenges:
-                    correct_predictions = 0
-                    for prediction in challenge.predictions:
-                        match = Match.query.filter_by(fixture_id=prediction.fixture_id).first()
-                        if match:
-                            actual_result = "draw"
-                            if match.home_score > match.away_score:
-                                actual_result = "home win"
-                            elif match.home_score < match.away_score:
-                                actual_result = "away win"
-
-                            if prediction.prediction == actual_result:
-                                correct_predictions += 1
-
-                    team = Team.query.filter_by( user_id = challenge.user.id).first()
-                    if correct_predictions == 4:
-                        team.total_points += 7
-                    elif correct_predictions == 3:
-                        team.total_points += 5
-                    db.session.commit()
-
-                players = Player.query.all()
-                teams = Team.query.all()
-                
-                for team in teams:
-                    team.add_total_points()
-                for player in players:
-                    player.reset_current_points()
-                        
-                GameWeek.increment_week()
+                gameweek = GameWeek.locked().current_week
+                UserChallenge.award_bonus_points(gameweek)
+                Team.add_all_total_points()
+                Player.reset_all_current_points()
+                DataVersion.bump('reference')
+                GameWeek.increment_week(deadline)
                 gameweek = GameWeek.get_current_week()
                 return render_template("admin.html", msg=f"Gameweek {gameweek} set"), 200
             except Exception as e:
@@ -1118,7 +2161,7 @@ def new_gameweek():
     else:
         return render_template("set_new_gameweek.html"), 200
 
-@app.route("/enterchallenge_manualy", methods=["Get","Post"])
+@bp.route("/enterchallenge_manualy", methods=["Get","Post"])
 def ente_user_challenge():
     email = request.args.get("email")
     if not email :
@@ -1132,7 +2175,7 @@ def ente_user_challenge():
     db.session.commit()
     return "Challenge Added"
 
-@app.route("/reset_page", methods=["GET", "POST"])
+@bp.route("/reset_page", methods=["GET", "POST"])
 def resetpassword():
     if request.method == "POST":
         data = request.form.to_dict()
@@ -1140,16 +2183,21 @@ def resetpassword():
         email = data.get('email')
         if not email or not password:
             return render_template("resetpage.html", msg='Enter email and password')
+        if not allow_auth_attempt(email):
+            return render_template("resetpage.html", msg="Too many attempts, try again later"), 429
         user = User.query.filter_by( email = email).first()
         if not user :
             return render_template("resetpage.html", msg="User email does not exsist")
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except TimeoutError:
+            return render_template("resetpage.html", msg="Server busy, try again"), 503
         db.session.commit()
         return render_template("sign_in.html", msg = "Password Updated")
     else:
         return render_template("resetpage.html")
         
-@app.route("/enter_player", methods=["GET"])
+@bp.route("/enter_player", methods=["GET"])
 def addplayer():
     name = request.args.get("name")
     swepteam = request.args.get("team")
@@ -1167,25 +2215,179 @@ def addplayer():
                     SwepLeagueTeam_id=Team.id
                 )
     db.session.add(player)
+    DataVersion.bump('reference')
     db.session.commit()
     return f"{player.name} Added to {Team.team_name} Succesfully"
     
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     session.pop("user_id", None)
     return redirect("/")
     
-@app.route("/reset_points", methods=["Get"])
+@bp.route("/reset_points", methods=["Get"])
 def reset_points():
     password = request.args.get("pass")
     if password and password == "yes":
         teams = Team.query.all()
         for team in teams:
             team.total_points = 0
+        DataVersion.bump('reference')
         db.session.commit()
         return "Points Removed"
     else:
         return redirect("/")
 
+@bp.app_url_defaults
+def fingerprint_static(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = static_assets.files.get(values['filename'], values['filename'])
+
+def versioned_response(etag, build, private=False):
+    # a client that already holds this version gets a 304 before any rows are loaded
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache" if private else "no-cache"
+    return response
+
+@bp.route("/api/fixtures", methods=["GET"])
+def api_fixtures():
+    gameweek = request.args.get("gameweek", type=int)
+    def build():
+        query = Fixture.query.options(db.joinedload(Fixture.home_team), db.joinedload(Fixture.away_team))
+        if gameweek is not None:
+            query = query.filter_by(game_week=gameweek)
+        fixtures = query.order_by(Fixture.game_week, Fixture.kickoff_time, Fixture.id).all()
+        return {"fixtures": FixtureSchema(many=True).dump(fixtures)}
+    return versioned_response(f"fixtures-{DataVersion.get('fixtures')}", build)
+
+@bp.route("/api/matches", methods=["GET"])
+def api_matches():
+    gameweek = request.args.get("gameweek", type=int)
+    def build():
+        query = Match.query
+        if gameweek is not None:
+            query = query.filter_by(game_week=gameweek)
+        matches = Match.preload_events(query.order_by(Match.game_week, Match.id).all())
+        return {"matches": MatchSchema(many=True).dump(matches)}
+    return versioned_response(f"results-{DataVersion.get('results')}", build)
+
+@bp.route("/api/standings", methods=["GET"])
+def api_standings():
+    def build():
+        return {"standings": SwepLeagueTeamSchema(many=True).dump(SwepLeagueTeam.standings())}
+    return versioned_response(f"results-{DataVersion.get('results')}", build)
+
+@bp.route("/api/players", methods=["GET"])
+def api_players():
+    def build():
+        return {"players": PlayerSchema(many=True).dump(reference_data().players)}
+    return versioned_response(f"players-{reference_version()}", build)
+
+@bp.route("/api/myteam", methods=["GET"])
+def api_my_team():
+    user_id = session.get("user_id")
+    if user_id is None:
+        return jsonify({"error": "Not logged in"}), 401
+    team = db.session.query(Team.id, Team.version).filter_by(user_id=user_id).order_by(Team.id).first()
+    if team is None:
+        return jsonify({"error": "Team not found"}), 404
+    def build():
+        myteam = db.session.get(Team, team.id, options=[db.selectinload(Team.players), db.joinedload(Team.captain)])
+        return TeamSchema().dump(myteam)
+    return versioned_response(f"team-{team.id}-{team.version}-{reference_version()}", build, private=True)
+
+@bp.route("/metrics", methods=["GET"])
+def export_metrics():
+    # scrapers send METRICS_TOKEN as a bearer token; without one configured the page is off
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return request_metrics.exposition(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@bp.cli.command("rebuild-standings")
+def rebuild_standings():
+    LeagueStanding.rebuild()
+    print("League standings rebuilt from matches")
+
+@bp.cli.command("refresh-gameweek-points")
+def refresh_gameweek_points():
+    Team.refresh_gameweek_points()
+    db.session.commit()
+    print("Gameweek points refreshed for every team")
+
+@bp.cli.command("build-assets")
+def build_assets():
+    manifest = StaticAssets.build(current_app.static_folder)
+    print(f"{len(manifest['files'])} static files fingerprinted, {len(manifest['webp'])} with smaller WebP twins, "
+          f"{len(manifest['compressed'])} precompressed")
+
+@bp.cli.command("set-deadline")
+@click.argument("deadline", required=False)
+def set_deadline(deadline):
+    deadline = datetime.strptime(deadline, '%Y-%m-%dT%H:%M') if deadline else None
+    GameWeek.set_deadline(deadline)
+    print(f"Gameweek {GameWeek.get_current_week()} deadline set to {deadline or 'the weekly window'}")
+
+@bp.cli.command("seed-scoring-rules")
+def seed_scoring_rules():
+    ScoringRule.seed_defaults()
+    db.session.commit()
+    print("Default scoring rules added")
 
-app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 10000)))
+@bp.cli.command("score-gameweek")
+def score_gameweek():
+    gameweek = GameWeek.get_current_week()
+    ScoringRule.score_gameweek(gameweek)
+    db.session.commit()
+    print(f"Player points computed for gameweek {gameweek}")
+
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Off by default, leaving /upload_points as the only source of current_points. When on,
+    # saving a result recomputes its players' points from the events, replacing any uploaded
+    # value; an upload made afterwards stands until that player's next result is saved.
+    app.config['AUTO_SCORING'] = os.environ.get('AUTO_SCORING', '0') == '1'
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_WAIT'] = float(os.environ.get('PASSWORD_HASH_WAIT', 5))
+    app.config['AUTH_ATTEMPTS_PER_IP'] = int(os.environ.get('AUTH_ATTEMPTS_PER_IP', 30))
+    app.config['AUTH_ATTEMPTS_PER_EMAIL'] = int(os.environ.get('AUTH_ATTEMPTS_PER_EMAIL', 5))
+    app.config['AUTH_ATTEMPT_WINDOW'] = int(os.environ.get('AUTH_ATTEMPT_WINDOW', 60))
+    # proxies in front of the app whose X-Forwarded-For is trusted; behind the platform
+    # router every client would otherwise share its address and one per-IP bucket
+    app.config['PROXY_HOPS'] = int(os.environ.get('PROXY_HOPS', 1))
+    app.config['FRAGMENT_CACHE_SIZE'] = int(os.environ.get('FRAGMENT_CACHE_SIZE', 512))
+    app.config['GAMEWEEK_CHECK_INTERVAL'] = float(os.environ.get('GAMEWEEK_CHECK_INTERVAL', 5))
+    app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 500))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.secret_key = os.environ.get('SECRET_KEY')
+    if config:
+        app.config.update(config)
+    if app.config['PROXY_HOPS']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'], x_proto=app.config['PROXY_HOPS'])
+
+    db.init_app(app)
+    ma.init_app(app)
+    bcrypt.init_app(app)
+    migrate.init_app(app, db)
+    password_hasher.init_app(app)
+    auth_throttle.init_app(app)
+    static_assets.init_app(app)
+    fragment_cache.init_app(app)
+    gameweek_cache.init_app(app)
+    request_metrics.init_app(app)
+    app.view_functions['static'] = serve_static
+    app.register_blueprint(bp)
+    return app
+
+
+if __name__ == "__main__":
+    create_app().run(host='0.0.0.0', port=int(os.environ.get('PORT', 10000)))
@@ -0,0 +1,254 @@
+"""Drive the main flows against a seeded database and report latency and SQL counts per route.
+
+    python benchmarks/routes.py [--sizes 20,200] [--users 30] [--database-url URL]
+
+Each size runs in a fresh process with N users, each owning a 15-player squad
+(plus a few users who still have to pick one), a full round of fixtures and
+played matches. The default database is a throwaway SQLite file; a Postgres
+URL works too, but its tables are dropped and recreated for every size.
+
+The run fails when a route issues more statements at the largest size than at
+the smallest one, which is how an N+1 shows up. The fragment cache is off
+unless --fragment-cache is given, so every request does its full work.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLUBS = 8
+SQUAD_SLOTS = ['Goalkeeper'] * 2 + ['Defender'] * 5 + ['Midfielder'] * 5 + ['Attacker'] * 3
+CLUB_PLAYERS = {'Goalkeeper': 3, 'Defender': 6, 'Midfielder': 6, 'Attacker': 4}
+PASSWORD = 'benchmark-password'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def squad_for(user_index, players_by_club):
+    # slot k comes from club (user + k) % 8: no club gets more than two players,
+    # and two slots from the same club never share a position
+    squad = []
+    for slot, position in enumerate(SQUAD_SLOTS):
+        candidates = players_by_club[(user_index + slot) % CLUBS][position]
+        squad.append(candidates[(user_index * 7 + slot) % len(candidates)])
+    return squad
+
+
+def seed(m, size, pickers):
+    db = m.db
+    db.drop_all()
+    db.create_all()
+    rng = random.Random(size)
+
+    db.session.execute(m.SwepLeagueTeam.__table__.insert(), [{'team_name': f"Club {club + 1}"} for club in range(CLUBS)])
+    club_ids = [club_id for club_id, in db.session.query(m.SwepLeagueTeam.id).order_by(m.SwepLeagueTeam.id)]
+    players = []
+    for club_id in club_ids:
+        for position, count in CLUB_PLAYERS.items():
+            for number in range(count):
+                players.append({
+                    'name': f"{position[:3]} {club_id}-{number}", 'position': position, 'SwepLeagueTeam_id': club_id,
+                    'price': Decimal('4.0') + Decimal('0.5') * (number % 4), 'current_points': 0, 'total_points': 0
+                })
+    db.session.execute(m.Player.__table__.insert(), players)
+    players_by_club = {index: {position: [] for position in CLUB_PLAYERS} for index in range(CLUBS)}
+    prices = {}
+    for player in m.Player.query.order_by(m.Player.id):
+        players_by_club[club_ids.index(player.SwepLeagueTeam_id)][player.position].append(player.id)
+        prices[player.id] = player.price
+
+    # a single round robin: every club meets every other club once
+    rotation = list(club_ids)
+    fixtures = []
+    for week in range(1, CLUBS):
+        for pair in range(CLUBS // 2):
+            fixtures.append({'game_week': week, 'home_team_id': rotation[pair], 'away_team_id': rotation[-1 - pair],
+                             'kickoff_time': date(2024, 1, 1) + timedelta(weeks=week)})
+        rotation = [rotation[0]] + [rotation[-1]] + rotation[1:-1]
+    db.session.execute(m.Fixture.__table__.insert(), fixtures)
+
+    password_user = m.User(username='hash', email='hash', favteam='hash')
+    password_user.set_password(PASSWORD)
+    users = [{'username': f"user{index}", 'email': f"user{index}@example.com", 'favteam': 'Club 1',
+              'password': password_user.password} for index in range(size + pickers)]
+    db.session.execute(m.User.__table__.insert(), users)
+    user_ids = [user_id for user_id, in db.session.query(m.User.id).order_by(m.User.id)]
+    teams, squads = [], {}
+    for index, user_id in enumerate(user_ids):
+        team = {'user_id': user_id, 'team_name': f"Team {index}", 'total_points': rng.randint(0, 300),
+                'gameweek_points': 0, 'budget': 85, 'version': 0, 'captain_id': None}
+        if index < size:
+            squads[user_id] = squad_for(index, players_by_club)
+            team['captain_id'] = max(squads[user_id], key=prices.get)
+        teams.append(team)
+    db.session.execute(m.Team.__table__.insert(), teams)
+    team_ids = dict(db.session.query(m.Team.user_id, m.Team.id))
+    db.session.execute(m.player_teams.insert(), [
+        {'team_id': team_ids[user_id], 'player_id': player_id}
+        for user_id, squad in squads.items() for player_id in squad
+    ])
+
+    m.GameWeek.get()
+    m.GameWeek.update(current_week=2, deadline=datetime(2100, 1, 1))
+    played = m.Fixture.query.filter_by(game_week=1).all()
+    results = []
+    for fixture in played:
+        home = players_by_club[club_ids.index(fixture.home_team_id)]
+        away = players_by_club[club_ids.index(fixture.away_team_id)]
+        events = {
+            'goals': {home['Attacker'][0]: 2, away['Midfielder'][1]: 1},
+            'assists': {home['Midfielder'][0]: 1},
+            'saves': {away['Goalkeeper'][0]: 3},
+            'yellow_cards': {home['Defender'][2]: 1},
+            'red_cards': {}
+        }
+        results.append((fixture, 2, 1, events))
+    m.save_match_results(results)
+    m.ScoringRule.seed_defaults()
+    m.ScoringRule.score_gameweek(1)
+    m.DataVersion.bump('reference')
+    db.session.commit()
+    names = {club_id: f"Club {club_ids.index(club_id) + 1}" for club_id in club_ids}
+    return user_ids, squads, players_by_club, club_ids, [(names[f.home_team_id], names[f.away_team_id]) for f in played]
+
+
+def transfer_for(squad, players_by_club, club_ids, m):
+    # swap one outfield player for a club-mate in the same position, keeping every squad rule
+    for player_id in squad:
+        player = m.db.session.get(m.Player, player_id)
+        for candidate in players_by_club[club_ids.index(player.SwepLeagueTeam_id)][player.position]:
+            if candidate not in squad and m.db.session.get(m.Player, candidate).price <= player.price:
+                return [candidate if p == player_id else p for p in squad]
+    return squad
+
+
+def run_size(size, users, database_url, fragment_cache):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import app as m
+    from sqlalchemy import event
+
+    app = m.create_app({
+        'BCRYPT_LOG_ROUNDS': 4,
+        'AUTH_ATTEMPTS_PER_IP': 10 ** 9,
+        'AUTH_ATTEMPTS_PER_EMAIL': 10 ** 9,
+        'FRAGMENT_CACHE_SIZE': 512 if fragment_cache else 0,
+        'GAMEWEEK_CHECK_INTERVAL': 0,
+    })
+    pickers = max(1, users // 5)
+    with app.app_context():
+        user_ids, squads, players_by_club, club_ids, played = seed(m, size, pickers)
+        statements = []
+        event.listen(m.db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    timings = {}
+
+    def hit(client, label, method, url, **kwargs):
+        statements.clear()
+        started = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise SystemExit(f"{label} returned {response.status_code}: {response.get_data(as_text=True)[:300]}")
+        timings.setdefault(label, []).append((elapsed, len(statements)))
+        return response
+
+    rng = random.Random(0)
+    squad_users = rng.sample(user_ids[:size], min(users, size))
+    for index, user_id in enumerate(squad_users):
+        client = app.test_client()
+        hit(client, 'POST /login', 'post', '/login', data={'email': f"user{user_ids.index(user_id)}@example.com", 'password': PASSWORD})
+        hit(client, 'GET /fixtures', 'get', '/fixtures')
+        hit(client, 'GET /tables', 'get', '/tables')
+        hit(client, 'GET /tables?me=1', 'get', '/tables?me=1')
+        home, away = played[index % len(played)]
+        hit(client, 'GET /match_details', 'get', f"/match_details?home={home}&away={away}")
+        hit(client, 'GET /myteam', 'get', '/myteam')
+        hit(client, 'GET /points', 'get', '/points')
+        hit(client, 'GET /transfers', 'get', '/transfers')
+        with app.app_context():
+            new_squad = transfer_for(squads[user_id], players_by_club, club_ids, m)
+        hit(client, 'POST /maketransfer', 'post', '/maketransfer', json={'players': new_squad})
+        hit(client, 'GET /api/myteam', 'get', '/api/myteam')
+
+    for index, user_id in enumerate(user_ids[size:]):
+        client = app.test_client()
+        hit(client, 'POST /login', 'post', '/login', data={'email': f"user{user_ids.index(user_id)}@example.com", 'password': PASSWORD})
+        hit(client, 'GET /pickteam', 'get', '/pickteam')
+        squad = squad_for(size + index, players_by_club)
+        hit(client, 'POST /checkpickedteam', 'post', '/checkpickedteam', json={'players': [{'id': player_id} for player_id in squad]})
+
+    hit(app.test_client(), 'POST /set_new_gameweek', 'post', '/set_new_gameweek', data={'answer': 'Yes'})
+    return {
+        label: {
+            'requests': len(samples),
+            'p50': percentile([elapsed for elapsed, _ in samples], 0.50) * 1000,
+            'p95': percentile([elapsed for elapsed, _ in samples], 0.95) * 1000,
+            'p99': percentile([elapsed for elapsed, _ in samples], 0.99) * 1000,
+            'queries': max(count for _, count in samples),
+        } for label, samples in timings.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="20,200", help="comma separated user counts to seed")
+    parser.add_argument("--users", type=int, default=30, help="users driven through the flows at each size")
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway sqlite file per size")
+    parser.add_argument("--fragment-cache", action="store_true")
+    parser.add_argument("--query-slack", type=int, default=0,
+                        help="extra statements a route may issue at the largest size")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        print(json.dumps(run_size(args.run_size, args.users, args.database_url, args.fragment_cache)))
+        return
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    reports = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            database_url = args.database_url or f"sqlite:///{os.path.join(tmp, f'routes-{size}.db')}"
+            command = [sys.executable, os.path.abspath(__file__), "--run-size", str(size), "--users", str(args.users),
+                       "--database-url", database_url]
+            if args.fragment_cache:
+                command.append("--fragment-cache")
+            output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+            if output.returncode:
+                sys.exit(output.stderr or output.stdout)
+            reports[size] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    print(f"{'route':<26}{'size':>7}{'reqs':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for label in reports[sizes[0]]:
+        for size in sizes:
+            row = reports[size][label]
+            print(f"{label:<26}{size:>7}{row['requests']:>6}{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}{row['queries']:>9}")
+
+    grown = [
+        f"{label}: {reports[sizes[0]][label]['queries']} queries at {sizes[0]} users, "
+        f"{reports[sizes[-1]][label]['queries']} at {sizes[-1]}"
+        for label in reports[sizes[0]]
+        if reports[sizes[-1]][label]['queries'] > reports[sizes[0]][label]['queries'] + args.query_slack
+    ]
+    if grown:
+        print("\nQuery count grows with data size:\n  " + "\n  ".join(grown))
+        sys.exit(1)
+    print(f"\nQuery counts are flat from {sizes[0]} to {sizes[-1]} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure how long a fresh process takes to build the app and answer its first request.
+
+    python benchmarks/startup.py [--runs 10]
+
+Each run starts a new interpreter, so the numbers include imports. "create_app"
+is the cost a gunicorn master pays once with preload_app; "first request" is
+what a forked worker still pays on its first hit (engine connect, template
+compile).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+from app import create_app, db
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+with app.app_context():
+    db.create_all()
+ready = time.perf_counter()
+response = app.test_client().get("/")
+answered = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    "import": imported - started,
+    "create_app": created - imported,
+    "first request": answered - ready,
+}))
+"""
+
+
+def run_once(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"))
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process total"] = time.perf_counter() - started
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--database-url", default=None,
+                        help="defaults to a throwaway sqlite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        runs = [run_once(database_url) for _ in range(args.runs)]
+
+    print(f"{'phase':<15}{'min ms':>10}{'median ms':>12}{'max ms':>10}")
+    for phase in runs[0]:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<15}{min(values):>10.1f}{statistics.median(values):>12.1f}{max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+
+# Settings come from the environment so the Procfile stays the same on every host:
+#   WEB_CONCURRENCY        number of worker processes
+#   GUNICORN_WORKER_CLASS  sync, gthread or gevent (gevent needs the gevent package installed)
+#   GUNICORN_THREADS       threads per worker for gthread
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+# The app is imported once in the master and the workers are forked from it,
+# so they share the loaded code and start without importing it again.
+# gevent patches the standard library when a worker starts, which is too late
+# for a preloaded app, so preloading is off for that worker class.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1' if worker_class != 'gevent' else '0') == '1'
+
+
+def post_fork(server, worker):
+    # connections opened by the master while preloading must not be shared with the workers:
+    # each worker starts a fresh pool and leaves the inherited sockets to the master
+    if preload_app:
+        from app import db
+        from wsgi import app
+        with app.app_context():
+            db.engine.dispose(close=False)
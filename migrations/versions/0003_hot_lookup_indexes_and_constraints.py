@@ -0,0 +1,131 @@
+"""indexes and unique constraints for hot lookups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 06:25:09.024772
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+match_event_tables = ['match_saves', 'match_goals', 'match_assists', 'match_yellow_cards', 'match_red_cards']
+
+
+def remove_duplicates():
+    # the unique constraints below fail on rows the old routes could duplicate:
+    # keep the first match per fixture and the latest prediction per fixture
+    match = sa.table('match', sa.column('id'), sa.column('fixture_id'))
+    duplicate_matches = sa.select(match.c.id).where(
+        match.c.id.not_in(sa.select(sa.func.min(match.c.id)).group_by(match.c.fixture_id))
+    )
+    for name in match_event_tables:
+        events = sa.table(name, sa.column('match_id'))
+        op.execute(sa.delete(events).where(events.c.match_id.in_(duplicate_matches)))
+    op.execute(sa.delete(match).where(match.c.id.in_(duplicate_matches)))
+
+    prediction = sa.table('user_prediction', sa.column('id'), sa.column('challenge_id'), sa.column('fixture_id'))
+    op.execute(sa.delete(prediction).where(
+        prediction.c.id.not_in(
+            sa.select(sa.func.max(prediction.c.id)).group_by(prediction.c.challenge_id, prediction.c.fixture_id)
+        )
+    ))
+
+
+def fill_league_standings():
+    # the same totals LeagueStanding.rebuild writes, so existing results show straight away
+    # and an edited result is taken out of a row that already holds it; built after the
+    # duplicate matches are gone, replacing anything an earlier 0002 counted from them
+    match = sa.table('match', sa.column('home_team_id'), sa.column('away_team_id'),
+                     sa.column('home_score'), sa.column('away_score'))
+    club = sa.table('swep_league_team', sa.column('id'))
+    standings = sa.table('league_standings', sa.column('team_id'), sa.column('matches_played'), sa.column('wins'),
+                         sa.column('draws'), sa.column('losses'), sa.column('goals_for'),
+                         sa.column('goals_against'), sa.column('points'))
+    results = sa.union_all(
+        sa.select(match.c.home_team_id.label('team_id'), match.c.home_score.label('scored'),
+                  match.c.away_score.label('conceded')),
+        sa.select(match.c.away_team_id.label('team_id'), match.c.away_score.label('scored'),
+                  match.c.home_score.label('conceded'))
+    ).subquery()
+    won = sa.func.coalesce(sa.func.sum(sa.case((results.c.scored > results.c.conceded, 1), else_=0)), 0)
+    drawn = sa.func.coalesce(sa.func.sum(sa.case((results.c.scored == results.c.conceded, 1), else_=0)), 0)
+    lost = sa.func.coalesce(sa.func.sum(sa.case((results.c.scored < results.c.conceded, 1), else_=0)), 0)
+    totals = sa.select(
+        club.c.id,
+        sa.func.count(results.c.team_id),
+        won,
+        drawn,
+        lost,
+        sa.func.coalesce(sa.func.sum(results.c.scored), 0),
+        sa.func.coalesce(sa.func.sum(results.c.conceded), 0),
+        3 * won + drawn
+    ).select_from(club).outerjoin(results, results.c.team_id == club.c.id).group_by(club.c.id)
+    op.execute(sa.delete(standings))
+    op.execute(standings.insert().from_select(
+        ['team_id', 'matches_played', 'wins', 'draws', 'losses', 'goals_for', 'goals_against', 'points'],
+        totals
+    ))
+
+
+def upgrade():
+    remove_duplicates()
+    fill_league_standings()
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('fixture', schema=None) as batch_op:
+        batch_op.create_index('ix_fixture_game_week', ['game_week'], unique=False)
+        batch_op.create_index('ix_fixture_home_team_id_away_team_id', ['home_team_id', 'away_team_id'], unique=False)
+
+    with op.batch_alter_table('match', schema=None) as batch_op:
+        batch_op.create_index('ix_match_game_week', ['game_week'], unique=False)
+        batch_op.create_unique_constraint('uq_match_fixture_id', ['fixture_id'])
+
+    with op.batch_alter_table('player', schema=None) as batch_op:
+        batch_op.create_index('ix_player_name', ['name'], unique=False)
+
+    with op.batch_alter_table('team', schema=None) as batch_op:
+        batch_op.create_index('ix_team_total_points_id', ['total_points', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_team_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('user_challenge', schema=None) as batch_op:
+        batch_op.create_index('ix_user_challenge_challenge_gameweek', ['challenge_gameweek'], unique=False)
+        batch_op.create_index('ix_user_challenge_user_id_challenge_gameweek', ['user_id', 'challenge_gameweek'], unique=False)
+
+    with op.batch_alter_table('user_prediction', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_user_prediction_challenge_id_fixture_id', ['challenge_id', 'fixture_id'])
+
+    # ### end Alembic commands ###
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('user_prediction', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_prediction_challenge_id_fixture_id', type_='unique')
+
+    with op.batch_alter_table('user_challenge', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_challenge_user_id_challenge_gameweek')
+        batch_op.drop_index('ix_user_challenge_challenge_gameweek')
+
+    with op.batch_alter_table('team', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_team_user_id'))
+        batch_op.drop_index('ix_team_total_points_id')
+
+    with op.batch_alter_table('player', schema=None) as batch_op:
+        batch_op.drop_index('ix_player_name')
+
+    with op.batch_alter_table('match', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_match_fixture_id', type_='unique')
+        batch_op.drop_index('ix_match_game_week')
+
+    with op.batch_alter_table('fixture', schema=None) as batch_op:
+        batch_op.drop_index('ix_fixture_home_team_id_away_team_id')
+        batch_op.drop_index('ix_fixture_game_week')
+
+    # ### end Alembic commands ###
@@ -0,0 +1,32 @@
+"""player lower(name) index with text_pattern_ops
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def recreate_lower_name_index(expression):
+    # only Postgres has operator classes; elsewhere the plain expression index stays
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_player_lower_name', table_name='player')
+    op.create_index('ix_player_lower_name', 'player', [sa.text(expression)], unique=False)
+
+
+def upgrade():
+    recreate_lower_name_index('lower(name) text_pattern_ops')
+
+
+def downgrade():
+    recreate_lower_name_index('lower(name)')
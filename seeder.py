@@ -1,35 +1,69 @@
 import csv
-from app import app, db, Player, SwepLeagueTeam
+from decimal import Decimal
+from flask_migrate import upgrade
+from app import create_app, db, Player, SwepLeagueTeam, DataVersion, ScoringRule
 
-def load_swep_teams(csv_file):
+def read_rows(csv_file, is_header):
     with open(csv_file, newline='') as file:
-        reader = csv.reader(file)
-        next(reader)
-        for row in reader:
-            team = SwepLeagueTeam(
-                team_name=row[0]
-            )
-            db.session.add(team)
-        db.session.commit()
+        rows = [row for row in csv.reader(file) if row and row[0].strip()]
+    if rows and is_header(rows[0]):
+        rows = rows[1:]
+    return rows
+
+def load_swep_teams(csv_file):
+    rows = read_rows(csv_file, lambda row: row[0].strip().lower() in ('team', 'team_name'))
+    existing = {name for name, in db.session.query(SwepLeagueTeam.team_name)}
+    new_teams = []
+    for row in rows:
+        name = row[0].strip()
+        if name not in existing:
+            existing.add(name)
+            new_teams.append({'team_name': name})
+    if new_teams:
+        db.session.execute(SwepLeagueTeam.__table__.insert(), new_teams)
+    print(f"Teams: {len(new_teams)} added, {len(rows) - len(new_teams)} already present")
 
 def load_players(csv_file):
-    with open(csv_file, newline='') as file:
-        reader = csv.reader(file)
-        next(reader)
-        for row in reader:
-            team = SwepLeagueTeam.query.filter_by(team_name=row[2]).first()
-            if team:
-                player = Player(
-                    name=row[0],
-                    position=row[1],
-                    price=row[3],
-                    SwepLeagueTeam_id=team.id
-                )
-                db.session.add(player)
-        db.session.commit()   
-        
+    # players are matched on (name, team) so the file can be loaded again to update prices and positions
+    rows = read_rows(csv_file, lambda row: row[0].strip().lower() == 'name')
+    teamids = {name: id for id, name in db.session.query(SwepLeagueTeam.id, SwepLeagueTeam.team_name)}
+    existing = {
+        (player.name, player.SwepLeagueTeam_id): player
+        for player in db.session.query(Player.id, Player.name, Player.position, Player.price, Player.SwepLeagueTeam_id)
+    }
+    inserts, updates, skipped = [], [], []
+    seen = set()
+    for row in rows:
+        name, position, team_name, price = (value.strip() for value in row[:4])
+        team_id = teamids.get(team_name)
+        if team_id is None or (name, team_id) in seen:
+            skipped.append(name)
+            continue
+        seen.add((name, team_id))
+        price = Decimal(price)
+        player = existing.get((name, team_id))
+        if player is None:
+            inserts.append({'name': name, 'position': position, 'price': price, 'SwepLeagueTeam_id': team_id,
+                            'current_points': 0, 'total_points': 0})
+        elif player.position != position or player.price != price:
+            updates.append({'b_id': player.id, 'b_position': position, 'b_price': price})
+    if inserts:
+        db.session.execute(Player.__table__.insert(), inserts)
+    if updates:
+        table = Player.__table__
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('b_id')).
+            values(position=db.bindparam('b_position'), price=db.bindparam('b_price')),
+            updates
+        )
+    print(f"Players: {len(inserts)} added, {len(updates)} updated, {len(skipped)} skipped")
+
+app = create_app()
+
 with app.app_context():
-    db.drop_all()
-    db.create_all()
+    upgrade()
     load_swep_teams('Swepleageteams.csv')
-    load_players('players.csv')
\ No newline at end of file
+    load_players('players.csv')
+    ScoringRule.seed_defaults()
+    DataVersion.bump('reference')
+    db.session.commit()
@@ -92,7 +92,7 @@ $(document).ready(function() {
             url: '/maketransfer',
             method: 'POST',
             contentType: 'application/json',
-            data: JSON.stringify({ players: teamPlayers }),
+            data: JSON.stringify({ players: teamPlayers, version: $('.pitch').data('version') }),
             success: function(response) {
                 alert(response.message);
                 window.location.href = "/transfers";
@@ -0,0 +1,79 @@
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as fsl
+
+CLUBS = 5
+CLUB_PLAYERS = {'Goalkeeper': 1, 'Defender': 2, 'Midfielder': 2, 'Attacker': 1}
+# (club, position) per slot: 2 GK, 5 DEF, 5 MID, 3 ATT with three players from each club
+SQUAD_SLOTS = [(1, 'Goalkeeper'), (2, 'Goalkeeper')] + \
+    [(club, 'Defender') for club in range(1, 6)] + \
+    [(club, 'Midfielder') for club in range(1, 6)] + \
+    [(club, 'Attacker') for club in range(3, 6)]
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = fsl.create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'fsl.db'}",
+        'SECRET_KEY': 'test',
+        'TESTING': True,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'AUTH_ATTEMPTS_PER_IP': 1000,
+        'AUTH_ATTEMPTS_PER_EMAIL': 1000,
+        'GAMEWEEK_CHECK_INTERVAL': 0,
+    })
+    # version numbers restart with every database, so drop the worker's snapshot
+    fsl.reference_cache.version = None
+    with app.app_context():
+        fsl.db.create_all()
+        fsl.GameWeek.get()
+        fsl.GameWeek.set_deadline(datetime(2100, 1, 1))
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def players(app):
+    """Ids of the seeded players keyed by (club number, position, index)."""
+    with app.app_context():
+        fsl.db.session.execute(fsl.SwepLeagueTeam.__table__.insert(),
+                               [{'team_name': f"Club {club}"} for club in range(1, CLUBS + 1)])
+        clubs = {name: id for id, name in fsl.db.session.query(fsl.SwepLeagueTeam.id, fsl.SwepLeagueTeam.team_name)}
+        fsl.db.session.execute(fsl.Player.__table__.insert(), [
+            {'name': f"{position} {club}-{index}", 'position': position, 'price': Decimal('5.0'),
+             'SwepLeagueTeam_id': clubs[f"Club {club}"], 'current_points': 0, 'total_points': 0}
+            for club in range(1, CLUBS + 1) for position, count in CLUB_PLAYERS.items() for index in range(count)
+        ])
+        fsl.DataVersion.bump('reference')
+        fsl.db.session.commit()
+        return {
+            (int(player.name.split()[1].split('-')[0]), player.position, int(player.name.split('-')[1])): player.id
+            for player in fsl.Player.query
+        }
+
+
+@pytest.fixture
+def squad(players):
+    return [players[(club, position, 0)] for club, position in SQUAD_SLOTS]
+
+
+@pytest.fixture
+def register(client):
+    def register(name):
+        response = client.post('/register', data={
+            'username': name, 'email': f"{name}@example.com", 'password': 'secret',
+            'team_name': f"{name} FC", 'favteam': 'Club 1'
+        })
+        assert response.status_code == 302
+    return register
@@ -0,0 +1,9 @@
+def test_login_throttle_is_per_forwarded_client(app, client):
+    app.config['AUTH_ATTEMPTS_PER_IP'] = 2
+
+    def login(address):
+        return client.post('/login', data={'email': 'nobody@example.com', 'password': 'x'},
+                           headers={'X-Forwarded-For': address}).status_code
+
+    assert [login('203.0.113.1') for _ in range(3)] == [401, 401, 429]
+    assert login('203.0.113.2') == 401
@@ -0,0 +1,15 @@
+from datetime import datetime
+
+import app as fsl
+
+
+def test_closed_transfers_name_the_deadline(app, client, register, squad):
+    register('manager')
+    assert client.post('/checkpickedteam', json={'players': squad}).status_code == 200
+    with app.app_context():
+        fsl.GameWeek.set_deadline(datetime(2024, 3, 2, 11, 30))
+
+    for response in (client.post('/maketransfer', json={'players': squad}),
+                     client.post('/change_captain', json={'captain': squad[1]})):
+        assert response.status_code == 403
+        assert response.get_json()['error'] == "Transfers for gameweek 1 closed at the deadline, Sat 02 Mar 2024 11:30."
@@ -0,0 +1,62 @@
+from datetime import date
+
+import pytest
+
+import app as fsl
+
+
+@pytest.fixture
+def fixture_id(app, players):
+    with app.app_context():
+        clubs = dict(fsl.db.session.query(fsl.SwepLeagueTeam.team_name, fsl.SwepLeagueTeam.id))
+        fixture = fsl.Fixture(game_week=1, home_team_id=clubs['Club 1'], away_team_id=clubs['Club 2'],
+                              kickoff_time=date(2024, 1, 6))
+        fsl.db.session.add(fixture)
+        fsl.db.session.commit()
+        return fixture.id
+
+
+def events(app):
+    with app.app_context():
+        return {(row.stat_type, row.player_id, row.count) for row in fsl.db.session.execute(fsl.Match.events_query())}
+
+
+def test_batch_saves_results_and_rewrites_changed_events(app, client, players, fixture_id):
+    striker, keeper = players[(1, 'Attacker', 0)], players[(2, 'Goalkeeper', 0)]
+    response = client.post('/update_matches_batch', json={'matches': [
+        {'fixture_id': fixture_id, 'home_score': 2, 'away_score': 0,
+         'goals': {str(striker): 2}, 'saves': {str(keeper): 4}}
+    ]})
+    assert response.status_code == 200
+    assert events(app) == {('goals', striker, 2), ('saves', keeper, 4)}
+
+    response = client.post('/update_matches_batch', json={'matches': [
+        {'home_team': 'Club 1', 'away_team': 'Club 2', 'home_score': 1, 'away_score': 0,
+         'goals': {str(striker): 1}, 'yellow_cards': [str(keeper)]}
+    ]})
+    assert response.status_code == 200
+    assert events(app) == {('goals', striker, 1), ('yellow_cards', keeper, 1)}
+
+
+@pytest.mark.parametrize('entry, status', [
+    ('not a match', 400),
+    ({'fixture_id': 'abc'}, 400),
+    ({'fixture_id': [1]}, 400),
+    ({'home_team': 'Club 1', 'away_team': 'Nowhere'}, 404),
+    ({'home_team': 'Club 1', 'away_team': 'Club 2', 'home_score': 'two'}, 400),
+    ({'home_team': 'Club 1', 'away_team': 'Club 2', 'goals': ['not', 'a', 'mapping']}, 400),
+])
+def test_batch_rejects_a_bad_entry_without_saving_any(app, client, fixture_id, entry, status):
+    valid = {'fixture_id': fixture_id, 'home_score': 1, 'away_score': 0}
+    response = client.post('/update_matches_batch', json={'matches': [valid, entry]})
+    assert response.status_code == status
+    assert 'error' in response.get_json()
+    with app.app_context():
+        assert fsl.Match.query.count() == 0
+
+
+def test_batch_rejects_a_repeated_fixture(client, fixture_id):
+    response = client.post('/update_matches_batch', json={'matches': [
+        {'fixture_id': fixture_id}, {'home_team': 'Club 1', 'away_team': 'Club 2'}
+    ]})
+    assert response.status_code == 400
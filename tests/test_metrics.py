@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import app as fsl
+
+
+def test_metrics_need_the_configured_token(app, client):
+    assert client.get('/metrics').status_code == 404
+
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    client.get('/tables')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200
+    assert 'fsl_request_sql_statements_count{endpoint="fsl.show_all_stats"}' in response.get_data(as_text=True)
+
+
+def test_failed_statement_does_not_leave_a_start_time_behind(app):
+    with app.app_context():
+        connection = fsl.db.session.connection()
+        with pytest.raises(OperationalError):
+            fsl.db.session.execute(fsl.db.text("SELECT * FROM no_such_table"))
+        assert connection.info.get('statement_started') == []
+
+
+def test_slow_log_leaves_out_the_query_string(app, client, caplog, monkeypatch):
+    monkeypatch.setattr(fsl.request_metrics, 'slow', 0)
+    client.get('/reset_points?pass=hunter2')
+    logged = [record.getMessage() for record in caplog.records if 'Slow request' in record.getMessage()]
+    assert logged and 'GET /reset_points ->' in logged[0]
+    assert 'hunter2' not in caplog.text
+
+
+@pytest.mark.parametrize('propagate', [True, False])
+def test_unhandled_errors_are_counted_as_500s(app, propagate, monkeypatch):
+    monkeypatch.setattr(fsl.request_metrics, 'requests', {})
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    app.config['PROPAGATE_EXCEPTIONS'] = propagate
+
+    def broken():
+        raise RuntimeError("boom")
+    app.add_url_rule('/broken', 'broken', broken)
+    client = app.test_client()
+
+    if propagate:
+        with pytest.raises(RuntimeError):
+            client.get('/broken')
+    else:
+        assert client.get('/broken').status_code == 500
+    text = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'}).get_data(as_text=True)
+    assert 'fsl_requests_total{endpoint="broken",method="GET",status="500"}' in text
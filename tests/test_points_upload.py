@@ -0,0 +1,36 @@
+import io
+
+import app as fsl
+
+
+def upload(client, text):
+    return client.post('/upload_points', data={'points_csv': (io.BytesIO(text.encode('utf-8-sig')), 'points.csv')},
+                       content_type='multipart/form-data')
+
+
+def points(app):
+    with app.app_context():
+        return dict(fsl.db.session.query(fsl.Player.id, fsl.Player.current_points))
+
+
+def test_csv_upload_sets_points_and_refreshes_teams(app, client, register, players, squad):
+    register('manager')
+    assert client.post('/checkpickedteam', json={'players': squad}).status_code == 200
+    striker, defender = players[(3, 'Attacker', 0)], players[(1, 'Defender', 0)]
+
+    response = upload(client, f"player_id,points\r\n{striker},9\r\n{defender},\r\n")
+    assert b'successfully for 2 players' in response.data
+    assert points(app)[striker] == 9
+    assert points(app)[defender] == 0
+    with app.app_context():
+        team = fsl.Team.query.one()
+        assert team.gameweek_points == 9 * (3 if team.captain_id == striker else 1)
+
+
+def test_csv_upload_with_a_bad_row_changes_nothing(app, client, players):
+    striker = players[(3, 'Attacker', 0)]
+    before = points(app)
+    response = upload(client, f"{striker},9\n{striker + 1000},4\n{striker},lots\n")
+    assert b'not found' in response.data
+    assert b'Invalid points value' in response.data
+    assert points(app) == before
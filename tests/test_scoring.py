@@ -0,0 +1,47 @@
+from datetime import date
+
+import app as fsl
+
+
+def add_fixture(game_week):
+    clubs = dict(fsl.db.session.query(fsl.SwepLeagueTeam.team_name, fsl.SwepLeagueTeam.id))
+    fixture = fsl.Fixture(game_week=game_week, home_team_id=clubs['Club 1'], away_team_id=clubs['Club 2'],
+                          kickoff_time=date(2024, 1, game_week))
+    fsl.db.session.add(fixture)
+    fsl.db.session.flush()
+    return fixture
+
+
+def goals(player_id, count):
+    return {'goals': {player_id: count}, 'assists': {}, 'saves': {}, 'yellow_cards': {}, 'red_cards': {}}
+
+
+def current_points(player_id):
+    return fsl.db.session.query(fsl.Player.current_points).filter_by(id=player_id).scalar()
+
+
+def test_uploaded_points_survive_a_saved_result_by_default(app, client, players):
+    striker = players[(1, 'Attacker', 0)]
+    response = client.post('/upload_points', data={str(striker): '7'})
+    assert b'successfully' in response.data
+    with app.app_context():
+        assert not app.config['AUTO_SCORING']
+        fsl.ScoringRule.seed_defaults()
+        fsl.save_match_results([(add_fixture(1), 1, 0, goals(striker, 1))])
+        fsl.db.session.commit()
+        assert current_points(striker) == 7
+
+
+def test_auto_scoring_only_rescores_the_current_gameweek(app, players):
+    app.config['AUTO_SCORING'] = True
+    striker = players[(1, 'Attacker', 0)]
+    with app.app_context():
+        fsl.ScoringRule.seed_defaults()
+        fsl.GameWeek.update(current_week=2)
+        fsl.save_match_results([(add_fixture(2), 1, 0, goals(striker, 1))])
+        fsl.db.session.commit()
+        assert current_points(striker) == 4
+
+        fsl.save_match_results([(add_fixture(1), 3, 0, goals(striker, 3))])
+        fsl.db.session.commit()
+        assert current_points(striker) == 4
@@ -0,0 +1,62 @@
+import pytest
+
+import app as fsl
+
+
+@pytest.fixture
+def team(app, client, register, squad):
+    register('manager')
+    assert client.post('/checkpickedteam', json={'players': squad}).status_code == 200
+    return team_row(app)
+
+
+def team_row(app):
+    with app.app_context():
+        team = fsl.Team.query.one()
+        return {'version': team.version, 'captain': team.captain_id, 'players': {player.id for player in team.players}}
+
+
+def test_transfer_with_a_stale_version_is_rejected(app, client, players, squad, team):
+    out, into = players[(1, 'Defender', 0)], players[(1, 'Defender', 1)]
+    new_squad = [into if player_id == out else player_id for player_id in squad]
+
+    response = client.post('/maketransfer', json={'players': new_squad, 'version': team['version']})
+    assert response.status_code == 200
+    assert response.get_json()['version'] == team['version'] + 1
+
+    response = client.post('/maketransfer', json={'players': squad, 'version': team['version']})
+    assert response.status_code == 409
+    assert response.get_json()['version'] == team['version'] + 1
+    assert team_row(app)['players'] == set(new_squad)
+
+
+def test_transfer_without_a_version_applies_to_the_latest(app, client, players, squad, team):
+    out, into = players[(1, 'Defender', 0)], players[(1, 'Defender', 1)]
+    new_squad = [into if player_id == out else player_id for player_id in squad]
+    assert client.post('/maketransfer', json={'players': new_squad}).status_code == 200
+    assert team_row(app)['players'] == set(new_squad)
+
+
+def test_transferring_out_the_captain_picks_a_new_one(app, client, players, squad, team):
+    out, into = players[(1, 'Defender', 0)], players[(1, 'Defender', 1)]
+    response = client.post('/change_captain', json={'captain': out, 'version': team['version']})
+    version = response.get_json()['version']
+
+    new_squad = [into if player_id == out else player_id for player_id in squad]
+    assert client.post('/maketransfer', json={'players': new_squad, 'version': version}).status_code == 200
+    assert team_row(app)['captain'] in set(new_squad)
+
+
+def test_captain_change_checks_version_and_squad(app, client, players, squad, team):
+    captain = next(player_id for player_id in squad if player_id != team['captain'])
+
+    response = client.post('/change_captain', json={'captain': captain, 'version': team['version'] - 1})
+    assert response.status_code == 409
+
+    response = client.post('/change_captain', json={'captain': players[(1, 'Defender', 1)], 'version': team['version']})
+    assert response.status_code == 400
+
+    response = client.post('/change_captain', json={'captain': captain, 'version': team['version']})
+    assert response.status_code == 200
+    assert team_row(app) == {'version': team['version'] + 1, 'captain': captain, 'players': set(squad)}
+    assert client.get('/change_captain').status_code == 405
@@ -0,0 +1,54 @@
+import app as fsl
+
+
+def test_new_team_shows_in_cached_fsl_table(app, client, register):
+    assert app.config['FRAGMENT_CACHE_SIZE'] > 0
+    register('first')
+    assert b'first FC' in client.get('/tables').data
+
+    register('second')
+    page = client.get('/tables').data
+    assert b'first FC' in page
+    assert b'second FC' in page
+
+
+def test_picked_squad_shows_in_cached_fsl_table(app, client, squad):
+    with app.app_context():
+        user = fsl.User(username='picker', email='picker@example.com', favteam='Club 1')
+        user.set_password('secret')
+        fsl.db.session.add(user)
+        fsl.db.session.commit()
+        user_id = user.id
+    assert b'Default Team Name' not in client.get('/tables').data
+
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    response = client.post('/checkpickedteam', json={'players': [{'id': player_id} for player_id in squad]})
+    assert response.status_code == 200
+    assert b'Default Team Name' in client.get('/tables').data
+
+
+def test_standings_pages_rank_ties_across_page_breaks(app):
+    points = [9, 9, 9, 9, 7, 7, 5, 5, 5, 5, 5, 2, 0, 0]
+    with app.app_context():
+        fsl.db.session.execute(fsl.Team.__table__.insert(), [
+            {'team_name': f"Team {index}", 'total_points': value, 'gameweek_points': 0, 'version': 0}
+            for index, value in enumerate(points)
+        ])
+        fsl.db.session.commit()
+        expected = {team.id: 1 + sum(other > team.total_points for other in points) for team in fsl.Team.query}
+
+        seen, after = {}, None
+        while True:
+            rows, _, has_next = fsl.Team.standings_page(after=after, limit=3)
+            seen.update({row.id: row.rank for row in rows})
+            if not has_next:
+                break
+            after = (rows[-1].total_points, rows[-1].id)
+        assert seen == expected
+
+        start = fsl.db.session.query(fsl.Team.total_points, fsl.Team.id).filter_by(total_points=5).first()
+        rows, has_previous, _ = fsl.Team.standings_page(start=tuple(start), limit=3)
+        assert has_previous and all(row.rank == expected[row.id] for row in rows)
+        rows, _, _ = fsl.Team.standings_page(before=(rows[0].total_points, rows[0].id), limit=3)
+        assert [row.rank for row in rows] == [expected[row.id] for row in rows]